@@ -1,5 +1,62 @@
 include(CMakePrintHelpers)
 
+# empty builds and installs everything; a profile only builds and installs
+# (install-distribution) the components it lists. these have to come before
+# the defaults below because set(... CACHE) doesn't overwrite
+set(DISTRIBUTION_PROFILE "" CACHE STRING "")
+if(DISTRIBUTION_PROFILE STREQUAL "tools")
+  # what native_tools/setup.py packages
+  set(LLVM_ENABLE_PROJECTS "llvm;mlir" CACHE STRING "")
+  set(MLIR_ENABLE_BINDINGS_PYTHON OFF CACHE BOOL "")
+  set(LLVM_DISTRIBUTION_COMPONENTS
+      llvm-tblgen
+      mlir-tblgen
+      mlir-linalg-ods-yaml-gen
+      mlir-pdll
+      llvm-config
+      FileCheck
+      CACHE STRING "")
+elseif(DISTRIBUTION_PROFILE STREQUAL "mlir-dev")
+  # enough for out-of-tree MLIR projects: libs, headers, cmake config and the
+  # tablegen tools the cmake config points at
+  set(LLVM_ENABLE_PROJECTS "llvm;mlir" CACHE STRING "")
+  set(MLIR_ENABLE_BINDINGS_PYTHON OFF CACHE BOOL "")
+  set(LLVM_DISTRIBUTION_COMPONENTS
+      llvm-headers
+      llvm-libraries
+      cmake-exports
+      llvm-tblgen
+      llvm-config
+      FileCheck
+      mlir-headers
+      mlir-libraries
+      mlir-cmake-exports
+      mlir-tblgen
+      mlir-linalg-ods-yaml-gen
+      mlir-pdll
+      CACHE STRING "")
+elseif(NOT DISTRIBUTION_PROFILE STREQUAL "")
+  message(FATAL_ERROR "Unrecognized DISTRIBUTION_PROFILE=${DISTRIBUTION_PROFILE}")
+endif()
+
+# the "perf" wheel: no assertions or statistics, ThinLTO. like the profiles this
+# has to come before the defaults it overrides
+option(BUILD_PERF "" OFF)
+if(BUILD_PERF)
+  # the compiler isn't known yet in a -C script, only what the env asks for.
+  # fat LTO objects (machine code + bitcode) keep the static libs in the wheel
+  # linkable by gcc/cl/non-LTO builds, and they're ELF only. anywhere else fail
+  # rather than ship a "perf" wheel without LTO
+  if(NOT CMAKE_SYSTEM_NAME STREQUAL "Linux" OR NOT "$ENV{CC}$ENV{CXX}" MATCHES "clang")
+    message(FATAL_ERROR "BUILD_PERF needs Linux and CC/CXX=clang (got CC='$ENV{CC}' CXX='$ENV{CXX}' on ${CMAKE_SYSTEM_NAME})")
+  endif()
+  set(LLVM_ENABLE_ASSERTIONS OFF CACHE BOOL "")
+  set(LLVM_FORCE_ENABLE_STATS OFF CACHE BOOL "")
+  set(LLVM_ENABLE_LTO Thin CACHE STRING "")
+  set(LLVM_ENABLE_FATLTO ON CACHE BOOL "")
+  set(LLVM_USE_LINKER lld CACHE STRING "")
+endif()
+
 set(LLVM_ENABLE_PROJECTS "llvm;mlir;clang;lld" CACHE STRING "")
 
 set(CMAKE_POLICY_DEFAULT_CMP0175 OLD CACHE STRING "")
@@ -154,6 +211,18 @@ set(LLVM_INCLUDE_GO_TESTS OFF CACHE BOOL "")
 # just set LLVM_FORCE_ENABLE_STATS and eat the cost for the sake of simplicity
 set(LLVM_FORCE_ENABLE_STATS ON CACHE BOOL "")
 
+# ALL prints every variable, DIFF writes them to config_variables.txt for setup.py
+# to diff against the previous configure, OFF does neither
+set(PRINT_CONFIG_VARIABLES "ALL" CACHE STRING "")
 get_cmake_property(_variableNames VARIABLES)
 list(SORT _variableNames)
-cmake_print_variables(${_variableNames})
+if(PRINT_CONFIG_VARIABLES STREQUAL "ALL")
+  cmake_print_variables(${_variableNames})
+elseif(PRINT_CONFIG_VARIABLES STREQUAL "DIFF")
+  set(_config_variables "")
+  foreach(_v ${_variableNames})
+    string(REPLACE "\n" "\\n" _value "${${_v}}")
+    string(APPEND _config_variables "${_v}=${_value}\n")
+  endforeach()
+  file(WRITE "${CMAKE_BINARY_DIR}/config_variables.txt" "${_config_variables}")
+endif()
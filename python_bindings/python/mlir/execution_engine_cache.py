@@ -0,0 +1,268 @@
+"""Persistent on-disk cache of ExecutionEngine code.
+
+On a miss the module is JIT compiled as usual, the resulting object is dumped,
+linked into a shared library and stored under a hash of the module IR, opt
+level, host target and shared libraries. On a hit that library is dlopened
+instead of running LLVM codegen again. The directory is bounded in size and
+evicts the least recently used entries.
+
+    from mlir.execution_engine_cache import cached_execution_engine
+    engine = cached_execution_engine(module, opt_level=3, shared_libs=[...])
+    engine.invoke("main", ...)
+
+Only modules whose external symbols all resolve from ``shared_libs`` (or libc)
+in a fresh process are stored. Anything that needs ``register_runtime`` or
+symbols only this process has is marked uncacheable and always gets a real
+``ExecutionEngine``.
+"""
+
+import ctypes
+import hashlib
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+from .execution_engine import ExecutionEngine
+
+__all__ = ["ObjectCache", "CachedLibraryEngine", "cached_execution_engine", "default_cache"]
+
+# bump when the key or the stored format changes
+CACHE_FORMAT = 1
+LIBRARY_SUFFIX = {"Darwin": ".dylib", "Windows": ".dll"}.get(platform.system(), ".so")
+
+
+def _mlir_version():
+    try:
+        from importlib.metadata import version
+
+        return version("mlir-python-bindings")
+    except Exception:
+        return "unknown"
+
+
+def host_target():
+    # the JIT targets the host CPU (features included), so objects aren't
+    # portable between machines sharing a cache directory
+    parts = [platform.system(), platform.machine()]
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/cpuinfo") as f:
+                for line in f:
+                    if line.startswith(("model name", "flags", "Features", "CPU part")):
+                        parts.append(line.strip())
+                    if not line.strip():
+                        break
+        except OSError:
+            pass
+    else:
+        parts.append(platform.processor())
+    return "\n".join(parts)
+
+
+# what a hit does: runtime libraries RTLD_GLOBAL, then the cached library
+# with every symbol bound now
+_LOAD_CHECK = """
+import ctypes, sys
+for p in sys.argv[2:]:
+    ctypes.CDLL(p, mode=ctypes.RTLD_GLOBAL)
+ctypes.CDLL(sys.argv[1])
+"""
+
+
+def _loads_standalone(lib, shared_libs):
+    res = subprocess.run(
+        [sys.executable, "-c", _LOAD_CHECK, str(lib), *map(str, shared_libs)], capture_output=True
+    )
+    return res.returncode == 0
+
+
+def _linker():
+    return os.environ.get("CC") or shutil.which("cc") or shutil.which("clang") or shutil.which("gcc")
+
+
+class CachedLibraryEngine:
+    """ExecutionEngine look-alike backed by a cached shared library."""
+
+    def __init__(self, path, shared_libs=()):
+        # runtime libraries first, so the cached code can bind to them
+        self._shared_libs = [ctypes.CDLL(str(p), mode=ctypes.RTLD_GLOBAL) for p in shared_libs]
+        self._lib = ctypes.CDLL(str(path))
+        self.path = Path(path)
+
+    def raw_lookup(self, name):
+        # same packed "_mlir_" wrapper ExecutionEngine::lookupPacked uses
+        try:
+            return ctypes.cast(getattr(self._lib, "_mlir_" + name), ctypes.c_void_p).value
+        except AttributeError:
+            return None
+
+    def lookup(self, name):
+        func = self.raw_lookup("_mlir_ciface_" + name)
+        if not func:
+            raise RuntimeError("Unknown function " + name)
+        prototype = ctypes.CFUNCTYPE(None, ctypes.c_void_p)
+        return prototype(func)
+
+    def invoke(self, name, *ctypes_args):
+        func = self.lookup(name)
+        packed_args = (ctypes.c_void_p * len(ctypes_args))()
+        for argNum in range(len(ctypes_args)):
+            packed_args[argNum] = ctypes.cast(ctypes_args[argNum], ctypes.c_void_p)
+        func(packed_args)
+
+    def register_runtime(self, name, callback):
+        # only libraries without unresolved externals are cached, so nothing
+        # in here binds to the callback; keep it alive like ExecutionEngine does
+        self._callbacks = getattr(self, "_callbacks", {})
+        self._callbacks[name] = callback
+
+
+class ObjectCache:
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = Path(
+            directory
+            or os.environ.get("MLIR_EXECUTION_ENGINE_CACHE_DIR")
+            or Path.home() / ".cache" / "mlir" / "execution_engine"
+        )
+        self.max_bytes = int(
+            max_bytes or os.environ.get("MLIR_EXECUTION_ENGINE_CACHE_SIZE") or 1 << 30
+        )
+        self.hits = self.misses = self.stores = self.evictions = self.uncacheable = 0
+        self._lock = threading.Lock()
+
+    def key(self, module, opt_level=2, shared_libs=()):
+        h = hashlib.sha256()
+        for part in [f"format={CACHE_FORMAT}", _mlir_version(), host_target(), f"O{opt_level}"]:
+            h.update(part.encode() + b"\0")
+        for p in shared_libs:
+            st = os.stat(p)
+            h.update(f"{os.path.abspath(p)}:{st.st_size}:{st.st_mtime_ns}".encode() + b"\0")
+        h.update(str(module).encode())
+        return h.hexdigest()
+
+    def path(self, key):
+        return self.directory / key[:2] / (key + LIBRARY_SUFFIX)
+
+    def marker(self, key):
+        # modules that can't be cached, so they aren't dumped and linked again
+        return self.directory / key[:2] / (key + ".uncacheable")
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def execution_engine(self, module, opt_level=2, shared_libs=None):
+        shared_libs = list(shared_libs or [])
+        key = self.key(module, opt_level, shared_libs)
+        path = self.path(key)
+        if path.exists():
+            try:
+                engine = CachedLibraryEngine(path, shared_libs)
+                # bump the LRU position
+                os.utime(path)
+                self._count("hits")
+                return engine
+            except OSError:
+                # stale or broken entry (e.g. a runtime library moved)
+                path.unlink(missing_ok=True)
+        self._count("misses")
+        if self.marker(key).exists():
+            self._count("uncacheable")
+            return ExecutionEngine(module, opt_level=opt_level, shared_libs=shared_libs)
+        engine = ExecutionEngine(
+            module, opt_level=opt_level, shared_libs=shared_libs, enable_object_dump=True
+        )
+        self._store(engine, path, shared_libs, self.marker(key))
+        return engine
+
+    def _store(self, engine, path, shared_libs=(), marker=None):
+        cc = _linker()
+        if cc is None or platform.system() == "Windows":
+            self._count("uncacheable")
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=path.parent) as tmp:
+            obj = Path(tmp) / "module.o"
+            lib = Path(tmp) / ("module" + LIBRARY_SUFFIX)
+            cmd = [cc, "-shared", "-o", str(lib), str(obj)]
+            if platform.system() == "Darwin":
+                # runtime symbols resolve at load time against shared_libs
+                cmd += ["-undefined", "dynamic_lookup"]
+            try:
+                engine.dump_to_object_file(str(obj))
+                ok = obj.exists() and subprocess.run(cmd, capture_output=True).returncode == 0
+            except (OSError, RuntimeError):
+                ok = False
+            # e.g. non-PIC relocations the linker can't put in a shared object,
+            # or externals that only resolve in this process (register_runtime)
+            if not ok or not _loads_standalone(lib, shared_libs):
+                self._count("uncacheable")
+                if marker is not None:
+                    marker.touch()
+                return
+            os.replace(lib, path)
+        self._count("stores")
+        self.evict()
+
+    def entries(self):
+        if not self.directory.exists():
+            return []
+        return [p for p in self.directory.glob("*/*" + LIBRARY_SUFFIX) if p.is_file()]
+
+    def size(self):
+        return sum(p.stat().st_size for p in self.entries())
+
+    def evict(self, max_bytes=None):
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = []
+        for p in self.entries():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in sorted(entries):
+            if total <= max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+            self._count("evictions")
+        return total
+
+    def clear(self):
+        self.evict(0)
+        for p in self.directory.glob("*/*.uncacheable"):
+            p.unlink(missing_ok=True)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "uncacheable": self.uncacheable,
+            "entries": len(self.entries()),
+            "bytes": self.size(),
+            "max_bytes": self.max_bytes,
+            "directory": str(self.directory),
+        }
+
+
+_default_cache = None
+
+
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ObjectCache()
+    return _default_cache
+
+
+def cached_execution_engine(module, opt_level=2, shared_libs=None, cache=None):
+    return (cache or default_cache()).execution_engine(module, opt_level, shared_libs)
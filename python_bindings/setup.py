@@ -1,10 +1,12 @@
 import glob
+import json
 import os
 import platform
 import re
 import shutil
 import subprocess
 import sys
+import sysconfig
 from datetime import datetime
 from importlib.metadata import version
 from pathlib import Path
@@ -13,11 +15,71 @@ from pprint import pprint
 from setuptools import Extension, setup
 from setuptools.command.build_ext import build_ext
 
+# scripts/ is copied next to this file before cibuildwheel runs
+sys.path.insert(0, str(Path(__file__).parent.resolve() / "scripts"))
+import build_jobs
+import configure_cache
+import dedup_tree
+import fast_link
+import strip_tree
+import symbols
+
 
 def check_env(build):
     return os.environ.get(build, 0) in {"1", "true", "True", "ON", "YES"}
 
 
+def capi_exports_file(build_temp, minimal=False):
+    return build_temp / (
+        f"MLIRPythonCAPI{'.minimal' if minimal else ''}."
+        + ("exp" if platform.system() == "Darwin" else "map")
+    )
+
+
+def capi_library(build_temp):
+    libs_dir = build_temp / "mlir" / "_mlir_libs"
+    return next(p for p in libs_dir.iterdir() if re.match(r"(lib)?MLIRPythonCAPI\.(so|dylib)$", p.name))
+
+
+def shrink_capi_exports(build_temp, minimal=False, defined=None):
+    # pass 1 linked MLIRPythonCAPI exporting everything; write the export list
+    # for pass 2 from what the filter keeps plus what the extension modules import.
+    # what pass 1 defined is kept, so later interpreters sharing the build dir
+    # can check the list against their own modules instead of redoing pass 1
+    capi = capi_library(build_temp)
+    importers = list(capi.parent.glob("_*.so"))
+    nm = os.environ.get("NM", "nm")
+    defined_file = build_temp / "MLIRPythonCAPI.defined.json"
+    if defined is None:
+        defined = symbols.defined_symbols([capi], nm)
+        defined_file.write_text(json.dumps(sorted(defined)))
+    required = symbols.undefined_symbols(importers, nm) & defined
+    exports = symbols.export_list(
+        defined, required, platform.system() == "Darwin", minimal
+    )
+    exports_file = capi_exports_file(build_temp, minimal)
+    with open(exports_file, "w") as f:
+        symbols.write_export_file(
+            exports, f, "exported-symbols" if platform.system() == "Darwin" else "version-script"
+        )
+    return capi, required, exports_file
+
+
+def has_capi_exports(build_temp, minimal=False):
+    return capi_exports_file(build_temp, minimal).exists() and (build_temp / "MLIRPythonCAPI.defined.json").exists()
+
+
+def reused_capi_exports(build_temp, minimal=False):
+    # -> (capi, required symbols it doesn't export) after linking with an
+    # earlier interpreter's export list
+    defined_file = build_temp / "MLIRPythonCAPI.defined.json"
+    capi = capi_library(build_temp)
+    nm = os.environ.get("NM", "nm")
+    defined = set(json.loads(defined_file.read_text()))
+    required = symbols.undefined_symbols(list(capi.parent.glob("_*.so")), nm) & defined
+    return capi, required - symbols.defined_symbols([capi], nm)
+
+
 class CMakeExtension(Extension):
     def __init__(self, name: str, sourcedir: str = "") -> None:
         super().__init__(name, sources=[])
@@ -95,6 +157,8 @@ class CMakeBuild(build_ext):
             "-DCMAKE_VISIBILITY_INLINES_HIDDEN=ON",
             "-DCMAKE_C_VISIBILITY_PRESET=hidden",
             "-DCMAKE_CXX_VISIBILITY_PRESET=hidden",
+            f"-DMLIR_PYTHON_STABLE_ABI={'ON' if STABLE_ABI else 'OFF'}",
+            f"-DMLIR_PYTHON_FREE_THREADED={'ON' if FREE_THREADED else 'OFF'}",
         ]
         if platform.system() == "Windows":
             cmake_args += [
@@ -159,25 +223,122 @@ class CMakeBuild(build_ext):
                 cmake_args += ["-DCMAKE_OSX_ARCHITECTURES={}".format(";".join(archs))]
 
         if "PARALLEL_LEVEL" not in os.environ:
-            build_args += [f"-j{str(2 * os.cpu_count())}"]
+            jobs = build_jobs.pick_jobs()
+            build_args += [f"-j{jobs['compile']}"]
+            # only the Ninja generator honors the LLVM job pools
+            for pool in ["LINK", "TABLEGEN"]:
+                if f"LLVM_PARALLEL_{pool}_JOBS" not in os.environ.get("CMAKE_ARGS", ""):
+                    cmake_args += [f"-DLLVM_PARALLEL_{pool}_JOBS={jobs[pool.lower()]}"]
         else:
             build_args += [f"-j{os.environ.get('PARALLEL_LEVEL')}"]
 
-        build_temp = Path(self.build_temp) / ext.name
+        if check_env("REUSE_BUILD_DIR"):
+            # one build dir for every interpreter: MLIRPythonCAPI and the other
+            # Python-independent targets are built once and only the extension
+            # modules get rebuilt against the next Python
+            build_temp = Path(ext.sourcedir) / "build" / "reuse" / ext.name
+            cmake_args = ["-UPython_*", "-UPython3_*", "-U_Python*", *cmake_args]
+        else:
+            build_temp = Path(self.build_temp) / ext.name
         if not build_temp.exists():
             build_temp.mkdir(parents=True)
 
+        shrink = "SHRINK_CAPI_EXPORTS" in os.environ and platform.system() != "Windows"
+        minimal = os.environ.get("SHRINK_CAPI_EXPORTS") == "minimal"
+        # pass 1 of SHRINK_CAPI_EXPORTS links without an export list, unless an
+        # earlier interpreter already wrote one into the shared build dir
+        reuse_exports = shrink and has_capi_exports(build_temp, minimal)
+        cmake_args += [
+            f"-DMLIR_PYTHON_CAPI_EXPORTS_FILE={capi_exports_file(build_temp, minimal) if reuse_exports else ''}"
+        ]
+
+        fast_link_info = None
+        if check_env("FAST_LINK"):
+            link_args, fast_link_info = fast_link.fast_link_args(build_temp, cmake_args)
+            cmake_args += link_args
+        else:
+            cmake_args[:0] = fast_link.reset_args(build_temp)
+        ninja_runs = len(fast_link.ninja_runs(build_temp))
+
         print("ENV", pprint(os.environ), file=sys.stderr)
         print("CMAKE_ARGS", cmake_args, file=sys.stderr)
 
+        cmake_lists = Path(ext.sourcedir) / "CMakeLists.txt"
+        if "CONFIGURE_CACHE_DIR" in os.environ:
+            cmake_args += configure_cache.seed_args(
+                os.environ["CONFIGURE_CACHE_DIR"], cmake_lists
+            )
+
         subprocess.run(
             ["cmake", ext.sourcedir, *cmake_args], cwd=build_temp, check=True
         )
-        subprocess.run(
+        if "CONFIGURE_CACHE_DIR" in os.environ:
+            configure_cache.update(os.environ["CONFIGURE_CACHE_DIR"], cmake_lists, build_temp)
+        build_jobs.run_build(
             ["cmake", "--build", ".", "--target", "install", *build_args],
             cwd=build_temp,
             check=True,
+            watchdog=not check_env("DISABLE_BUILD_WATCHDOG"),
         )
+        relink = shrink
+        if reuse_exports:
+            capi, missing = reused_capi_exports(build_temp, minimal)
+            relink = bool(missing)
+            if relink:
+                # this interpreter's modules import more than the list exports
+                print(f"EXPORTS {capi.name}: list misses {sorted(missing)[:10]}, relinking", file=sys.stderr)
+            else:
+                print(f"EXPORTS {capi.name}: reused the export list", file=sys.stderr)
+        if relink:
+            nm = os.environ.get("NM", "nm")
+            defined = None
+            if reuse_exports:
+                defined = set(json.loads((build_temp / "MLIRPythonCAPI.defined.json").read_text()))
+            capi, required, exports_file = shrink_capi_exports(build_temp, minimal, defined)
+            before = symbols.export_stats(capi, nm)
+            subprocess.run(
+                ["cmake", ".", f"-DMLIR_PYTHON_CAPI_EXPORTS_FILE={exports_file}"],
+                cwd=build_temp,
+                check=True,
+            )
+            build_jobs.run_build(
+                ["cmake", "--build", ".", "--target", "install", *build_args],
+                cwd=build_temp,
+                check=True,
+                watchdog=not check_env("DISABLE_BUILD_WATCHDOG"),
+            )
+            after = symbols.export_stats(capi, nm)
+            (build_temp / "capi_exports.json").write_text(
+                json.dumps({"before": before, "after": after}, indent=2)
+            )
+            print(
+                f"EXPORTS {capi.name}: {before['exports']} -> {after['exports']} exported symbols, "
+                f".dynsym {before['dynsym_bytes']} -> {after['dynsym_bytes']} bytes, "
+                f"file {before['file_bytes'] / 2**20:.1f}MB -> {after['file_bytes'] / 2**20:.1f}MB",
+                file=sys.stderr,
+            )
+            missing = required - symbols.defined_symbols([capi], nm)
+            if missing:
+                raise RuntimeError(f"{capi.name} no longer exports {sorted(missing)[:10]}")
+        fast_link.fatten_archives(install_dir, build_temp)
+        if fast_link_info is not None:
+            fast_link.link_report(build_temp, build_temp, ninja_runs, fast_link_info)
+        if STABLE_ABI and platform.system() != "Windows":
+            not_abi3 = [
+                p.name
+                for p in (install_dir / "mlir" / "_mlir_libs").glob("_*.so")
+                if ".abi3." not in p.name
+            ]
+            if not_abi3:
+                raise RuntimeError(f"STABLE_ABI build produced version-specific modules: {not_abi3}")
+        if check_env("STRIP_INSTALL_TREE"):
+            strip_tree.strip_and_report(
+                install_dir / "mlir",
+                build_temp,
+                debug_dir=os.environ.get("STRIP_DEBUG_DIR"),
+            )
+        if check_env("DEDUP_INSTALL_TREE"):
+            dedup_tree.cross_check(MLIR_INSTALL_ABS_PATH, install_dir / "mlir" / "_mlir_libs")
 
 
 if len(sys.argv) > 1 and sys.argv[1] == "--plat":
@@ -190,6 +351,11 @@ if len(sys.argv) > 1 and sys.argv[1] == "--plat":
     exit()
 
 BUILD_CUDA = check_env("BUILD_CUDA")
+# free-threaded (cp313t) interpreters; the wheel gets the cp313t tag from bdist_wheel
+FREE_THREADED = bool(sysconfig.get_config_var("Py_GIL_DISABLED"))
+# nanobind can only target the stable ABI from 3.12 on; older interpreters
+# still get their own wheels, and there's no limited API for free-threaded builds
+STABLE_ABI = check_env("STABLE_ABI") and sys.version_info >= (3, 12) and not FREE_THREADED
 
 version = version("mlir")
 
@@ -208,6 +374,7 @@ setup(
     long_description_content_type="text/markdown",
     ext_modules=[CMakeExtension("mlir", sourcedir=".")],
     cmdclass={"build_ext": CMakeBuild},
+    options={"bdist_wheel": {"py_limited_api": "cp312"}} if STABLE_ABI else {},
     zip_safe=False,
     python_requires=">=3.8",
     download_url=llvm_url,
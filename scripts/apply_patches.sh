@@ -1,6 +1,7 @@
 #!/usr/bin/env bash
 set -uxo pipefail
 
+# keep in sync with applied_patches in build_cache.py
 # note that space before slash is important
 PATCHES="\
 add_td_to_mlirpythoncapi_headers \
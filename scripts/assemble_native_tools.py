@@ -0,0 +1,138 @@
+import argparse
+import ast
+import csv
+import io
+import os
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+from split_wheel import _dist, _record_hash, read_wheel_info
+
+# builds the mlir-native-tools wheel straight out of the mlir wheel: the
+# tools' zip members are copied as they are (still deflated, same CRC) and
+# their RECORD hashes come from the mlir wheel's RECORD, so nothing gets
+# inflated, deflated or hashed again
+
+HERE = Path(__file__).parent.resolve()
+NATIVE_TOOLS_SETUP = HERE.parent / "native_tools" / "setup.py"
+NAME = "mlir-native-tools"
+
+
+def tool_names(setup_py=NATIVE_TOOLS_SETUP):
+    # the `for bin in [...]` list in native_tools/setup.py
+    for node in ast.walk(ast.parse(Path(setup_py).read_text())):
+        if isinstance(node, ast.For) and isinstance(node.iter, ast.List):
+            return [ast.literal_eval(e) for e in node.iter.elts]
+    raise ValueError(f"no tool list in {setup_py}")
+
+
+def native_tools_version(mlir_version):
+    # 20.0.0.2024061701+cuda.perf.abcdef12 -> 20.0.0.2024061701+abcdef12
+    version, _, local = mlir_version.partition("+")
+    return f"{version}+{local.split('.')[-1]}" if local else version
+
+
+def copy_raw(src, info, out, arcname):
+    # local header of the source member -> where its compressed data starts
+    f = src.fp
+    f.seek(info.header_offset)
+    header = f.read(zipfile.sizeFileHeader)
+    if header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"bad local header for {info.filename} in {src.filename}")
+    name_len, extra_len = int.from_bytes(header[26:28], "little"), int.from_bytes(header[28:30], "little")
+    f.seek(info.header_offset + zipfile.sizeFileHeader + name_len + extra_len)
+    data = f.read(info.compress_size)
+
+    new = zipfile.ZipInfo(arcname, info.date_time)
+    new.compress_type = info.compress_type
+    new.create_system = info.create_system
+    new.external_attr = info.external_attr
+    new.CRC, new.compress_size, new.file_size = info.CRC, info.compress_size, info.file_size
+    # sizes and CRC are known up front, no data descriptor
+    new.flag_bits = info.flag_bits & ~0x08
+    # ZipFile has no public way to add already-compressed data: write the
+    # member by hand and register it so close() puts it in the central directory
+    new.header_offset = out.fp.tell()
+    out.fp.write(new.FileHeader())
+    out.fp.write(data)
+    out.filelist.append(new)
+    out.NameToInfo[arcname] = new
+    out.start_dir = out.fp.tell()
+    out._didModify = True
+    return new
+
+
+def assemble(mlir_wheel, dist_dir, plat=None, version=None, tools=None):
+    mlir_wheel = Path(mlir_wheel)
+    tools = tools or tool_names()
+    with zipfile.ZipFile(mlir_wheel) as src:
+        _, _, _, mlir_version, record = read_wheel_info(src)
+        version = version or os.environ.get("MLIR_WHEEL_VERSION") or native_tools_version(mlir_version)
+        if plat is None:
+            # {name}-{version}(-{build})?-{python}-{abi}-{platform}.whl, where the
+            # platform can be a compressed tag set (manylinux_2_27_x86_64.manylinux_2_28_x86_64)
+            plat = mlir_wheel.stem.rsplit("-", 1)[1]
+        else:
+            # what bdist_wheel --plat-name does to it
+            plat = plat.replace("-", "_").replace(".", "_")
+
+        members = []
+        for tool in tools:
+            for name in [f"mlir/bin/{tool}", f"mlir/bin/{tool}.exe"]:
+                if name in src.NameToInfo:
+                    members.append((tool + name[len(f"mlir/bin/{tool}") :], src.NameToInfo[name]))
+                    break
+            else:
+                raise KeyError(f"{tool} is not in {mlir_wheel.name}")
+
+        dist = _dist(NAME)
+        data_dir = f"{dist}-{version}.data/data/bin"
+        dist_info = f"{dist}-{version}.dist-info"
+        out_path = Path(dist_dir) / f"{dist}-{version}-py3-none-{plat}.whl"
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        rows = []
+        with zipfile.ZipFile(out_path, "w", zipfile.ZIP_DEFLATED) as out:
+            for tool, info in members:
+                arcname = f"{data_dir}/{tool}"
+                copy_raw(src, info, out, arcname)
+                digest, size = record.get(info.filename) or (None, None)
+                if digest is None:
+                    data = src.read(info.filename)
+                    digest, size = _record_hash(data), len(data)
+                rows.append((arcname, digest, size))
+
+            metadata = f"Metadata-Version: 2.1\nName: {NAME}\nVersion: {version}\n"
+            wheel_file = "\n".join(
+                ["Wheel-Version: 1.0", "Generator: assemble_native_tools.py", "Root-Is-Purelib: true"]
+                + [f"Tag: py3-none-{p}" for p in plat.split(".")]
+            )
+            for name, text in [("METADATA", metadata), ("WHEEL", wheel_file + "\n")]:
+                data = text.encode()
+                out.writestr(f"{dist_info}/{name}", data)
+                rows.append((f"{dist_info}/{name}", _record_hash(data), len(data)))
+            buf = io.StringIO()
+            csv.writer(buf, lineterminator="\n").writerows(rows + [(f"{dist_info}/RECORD", "", "")])
+            out.writestr(f"{dist_info}/RECORD", buf.getvalue())
+    return out_path, members
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the mlir-native-tools wheel from the mlir wheel without recompressing")
+    parser.add_argument("wheel", help="the mlir wheel")
+    parser.add_argument("-o", "--dist-dir", default="wheelhouse")
+    parser.add_argument("--plat", default=None, help="platform tag (default: the mlir wheel's)")
+    parser.add_argument(
+        "--version", default=None, help="default $MLIR_WHEEL_VERSION or <version>+<commit> of the mlir wheel"
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    out, members = assemble(args.wheel, args.dist_dir, args.plat, args.version)
+    size = sum(i.file_size for _, i in members)
+    print(
+        f"NATIVE_TOOLS {out.name}: {len(members)} tools, {size / 2**20:.1f}MB uncompressed, "
+        f"{out.stat().st_size / 2**20:.1f}MB in {time.perf_counter() - start:.2f}s",
+        file=sys.stderr,
+    )
@@ -0,0 +1,333 @@
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# runs inside the venv; prints one JSON line
+IMPORT_SNIPPET = r"""
+import json, pkgutil, sys, time
+t = {}
+start = time.perf_counter()
+import mlir.ir
+t["mlir.ir"] = time.perf_counter() - start
+import mlir.dialects
+for m in sorted(m.name for m in pkgutil.iter_modules(mlir.dialects.__path__)):
+    if m.startswith("_"):
+        continue
+    s = time.perf_counter()
+    try:
+        __import__(f"mlir.dialects.{m}")
+        t[f"mlir.dialects.{m}"] = time.perf_counter() - s
+    except Exception as e:
+        t[f"mlir.dialects.{m}"] = repr(e)
+t["mlir.dialects.*"] = time.perf_counter() - start - t["mlir.ir"]
+if EXECUTION_ENGINE:
+    s = time.perf_counter()
+    try:
+        from mlir.execution_engine import ExecutionEngine
+        with mlir.ir.Context(), mlir.ir.Location.unknown():
+            module = mlir.ir.Module.parse('''
+              llvm.func @add(%a: i32, %b: i32) -> i32 attributes {llvm.emit_c_interface} {
+                %0 = llvm.add %a, %b : i32
+                llvm.return %0 : i32
+              }''')
+            ExecutionEngine(module, opt_level=2)
+        t["ExecutionEngine"] = time.perf_counter() - s
+    except Exception as e:
+        t["ExecutionEngine"] = repr(e)
+t["total"] = time.perf_counter() - start
+print(json.dumps(t))
+"""
+
+# dlopens the libraries (dependencies first) so each time is that library's
+# own load + relocation cost
+DLOPEN_SNIPPET = r"""
+import ctypes, json, os, sys, time
+t = {}
+for path in sys.argv[1:]:
+    s = time.perf_counter()
+    try:
+        ctypes.CDLL(path, mode=os.RTLD_NOW | os.RTLD_GLOBAL)
+        t[path] = time.perf_counter() - s
+    except OSError as e:
+        t[path] = repr(e)
+print(json.dumps(t))
+"""
+
+SHARED_LIB_RE = re.compile(r"\.(so|dylib|pyd|dll)(\.\d+)*$")
+
+
+def venv_python(venv):
+    return Path(venv) / ("Scripts/python.exe" if platform.system() == "Windows" else "bin/python")
+
+
+def make_venv(venv, wheel, find_links, extra=()):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "venv", "--clear", str(venv)], check=True)
+    links = [f"--find-links={l}" for l in find_links]
+    subprocess.run(
+        [str(venv_python(venv)), "-m", "pip", "install", "-q", "--force-reinstall", str(wheel), *extra, *links],
+        check=True,
+    )
+    print(f"IMPORT installed {Path(wheel).name} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+_SYS_TAGS = """
+try:
+    from packaging import tags
+except ImportError:
+    from pip._vendor.packaging import tags
+print("\\n".join(str(t) for t in tags.sys_tags()))
+"""
+
+
+def pick_wheel(wheelhouse, python=sys.executable):
+    # the wheelhouse has one bindings wheel per interpreter (cp313t included),
+    # take the best match for the one the venv is made from, newest on ties
+    res = subprocess.run([str(python), "-c", _SYS_TAGS], capture_output=True, text=True, check=True)
+    rank = {t: i for i, t in enumerate(res.stdout.split())}
+    best = None
+    for w in Path(wheelhouse).glob("mlir_python_bindings-*.whl"):
+        python_tags, abis, platforms = w.stem.split("-")[-3:]
+        ranks = [
+            rank[f"{p}-{a}-{plat}"]
+            for p in python_tags.split(".")
+            for a in abis.split(".")
+            for plat in platforms.split(".")
+            if f"{p}-{a}-{plat}" in rank
+        ]
+        if ranks and (best is None or (min(ranks), -w.stat().st_mtime) < best[0]):
+            best = ((min(ranks), -w.stat().st_mtime), w)
+    if best is None:
+        raise RuntimeError(f"no mlir_python_bindings wheel in {wheelhouse} installs on {python}")
+    return best[1]
+
+
+def package_dir(python):
+    res = subprocess.run(
+        [str(python), "-c", "import importlib.util; print(importlib.util.find_spec('mlir').submodule_search_locations[0])"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return Path(res.stdout.strip())
+
+
+def shared_libs(pkg):
+    return sorted(p for p in pkg.rglob("*") if p.is_file() and SHARED_LIB_RE.search(p.name))
+
+
+def needed(path):
+    if platform.system() == "Darwin":
+        res = subprocess.run(["otool", "-L", str(path)], capture_output=True, text=True)
+        return {Path(l.split()[0]).name for l in res.stdout.splitlines()[1:] if l.strip()}
+    if platform.system() == "Linux":
+        res = subprocess.run(["readelf", "-d", str(path)], capture_output=True, text=True)
+        return set(re.findall(r"\(NEEDED\)\s+Shared library: \[(.*)\]", res.stdout))
+    return set()
+
+
+def load_order(libs):
+    # dependencies before dependents, among the libraries in the package
+    by_name = {p.name: p for p in libs}
+    deps = {p: {by_name[n] for n in needed(p) if n in by_name and by_name[n] != p} for p in libs}
+    order, done = [], set()
+
+    def visit(p, stack=()):
+        if p in done or p in stack:
+            return
+        for d in sorted(deps[p]):
+            visit(d, stack + (p,))
+        done.add(p)
+        order.append(p)
+
+    for p in libs:
+        visit(p)
+    return order
+
+
+def relocations(path):
+    # static count from the relocation section sizes; None where we can't tell
+    if platform.system() != "Linux" or not shutil.which("readelf"):
+        return None
+    res = subprocess.run(["readelf", "-S", "-W", str(path)], capture_output=True, text=True)
+    count = 0
+    for line in res.stdout.splitlines():
+        m = re.search(r"\]\s+\S+\s+(RELA?)\s+\S+\s+\S+\s+([0-9a-f]+)\s+([0-9a-f]+)", line)
+        if m and int(m.group(3), 16):
+            count += int(m.group(2), 16) // int(m.group(3), 16)
+    return count
+
+
+def evict(paths):
+    # drop the files from the page cache so the next run reads them from disk
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    for p in paths:
+        fd = os.open(p, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    return True
+
+
+def ld_statistics(stderr):
+    stats = {}
+    for key in ["final number of relocations", "final number of relocations from cache"]:
+        m = re.search(rf"\s{key}: (\d+)", stderr)
+        if m:
+            stats[key.replace("final number of ", "")] = int(m.group(1))
+    return stats
+
+
+def run_import(python, execution_engine, ld_debug=False):
+    # the loader's own accounting slows it down, so LD_DEBUG only goes on
+    # runs that aren't timed
+    env = dict(os.environ)
+    env.pop("LD_DEBUG", None)
+    if ld_debug and platform.system() == "Linux":
+        env["LD_DEBUG"] = "statistics"
+    snippet = f"EXECUTION_ENGINE = {execution_engine}\n" + IMPORT_SNIPPET
+    start = time.perf_counter()
+    res = subprocess.run([str(python), "-c", snippet], capture_output=True, text=True, env=env)
+    wall = time.perf_counter() - start
+    if res.returncode != 0:
+        raise RuntimeError(f"import failed:\n{res.stderr[-4000:]}")
+    times = json.loads(res.stdout.strip().splitlines()[-1])
+    times["process"] = wall
+    return times, ld_statistics(res.stderr)
+
+
+def run_dlopen(python, order):
+    res = subprocess.run(
+        [str(python), "-c", DLOPEN_SNIPPET, *map(str, order)], capture_output=True, text=True, check=True
+    )
+    return json.loads(res.stdout.strip().splitlines()[-1])
+
+
+def _ms(v):
+    return round(v * 1000, 3) if isinstance(v, float) else v
+
+
+def bench(python, repeat, execution_engine=True):
+    pkg = package_dir(python)
+    libs = shared_libs(pkg)
+
+    cold_evicted = evict(libs)
+    cold, _ = run_import(python, execution_engine)
+    warm_runs = [run_import(python, execution_engine)[0] for _ in range(repeat)]
+    # relocation statistics from separate, untimed runs
+    evict(libs)
+    _, cold_ld = run_import(python, execution_engine, ld_debug=True)
+    _, warm_ld = run_import(python, execution_engine, ld_debug=True)
+    warm = {}
+    for key in warm_runs[0]:
+        values = [r[key] for r in warm_runs if isinstance(r.get(key), float)]
+        warm[key] = statistics.median(values) if values else warm_runs[0][key]
+
+    order = load_order(libs)
+    evict(libs)
+    dlopen_cold = run_dlopen(python, order)
+    dlopen_warm = [run_dlopen(python, order) for _ in range(repeat)]
+    libraries = []
+    for p in order:
+        key = str(p)
+        warm_values = [r[key] for r in dlopen_warm if isinstance(r[key], float)]
+        libraries.append(
+            {
+                "name": p.relative_to(pkg).as_posix(),
+                "bytes": p.stat().st_size,
+                "relocations": relocations(p),
+                "dlopen_cold_ms": _ms(dlopen_cold[key]),
+                "dlopen_warm_ms": _ms(statistics.median(warm_values)) if warm_values else dlopen_warm[0][key],
+            }
+        )
+
+    return {
+        "python": subprocess.run(
+            [str(python), "-c", "import sys; print(sys.version.split()[0])"], capture_output=True, text=True
+        ).stdout.strip(),
+        "platform": f"{platform.system()}-{platform.machine()}",
+        "repeat": repeat,
+        "cold_evicted": cold_evicted,
+        "cold_ms": {k: _ms(v) for k, v in cold.items()},
+        "warm_ms": {k: _ms(v) for k, v in warm.items()},
+        "ld_statistics": {"cold": cold_ld, "warm": warm_ld},
+        "libraries": libraries,
+    }
+
+
+def print_report(result, baseline=None):
+    def delta(section, key):
+        if not baseline:
+            return ""
+        old = baseline.get(section, {}).get(key)
+        new = result[section].get(key)
+        if isinstance(old, (int, float)) and isinstance(new, (int, float)) and old:
+            return f" ({(new - old) / old * 100:+.1f}%)"
+        return ""
+
+    for section in ["cold_ms", "warm_ms"]:
+        for key in ["process", "mlir.ir", "mlir.dialects.*", "ExecutionEngine", "total"]:
+            if isinstance(result[section].get(key), (int, float)):
+                print(f"IMPORT {section[:-3]} {key}: {result[section][key]}ms{delta(section, key)}")
+    for section, stats in result["ld_statistics"].items():
+        if stats:
+            print(f"IMPORT ld.so {section}: {stats}")
+
+    def cold(lib):
+        return lib["dlopen_cold_ms"] if isinstance(lib["dlopen_cold_ms"], float) else 0
+
+    for lib in sorted(result["libraries"], key=cold, reverse=True):
+        print(
+            f"DLOPEN {lib['name']}: cold {lib['dlopen_cold_ms']}ms warm {lib['dlopen_warm_ms']}ms, "
+            f"{lib['bytes'] / 2**20:.1f}MB, {lib['relocations']} relocations"
+        )
+    failed = {k: v for k, v in result["warm_ms"].items() if isinstance(v, str)}
+    for k, v in failed.items():
+        print(f"IMPORT {k} failed: {v}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark import and dlopen cost of the mlir python bindings wheel")
+    parser.add_argument("wheel", nargs="?", help="mlir_python_bindings wheel (default: newest in wheelhouse/)")
+    parser.add_argument("--venv", default=None, help="reuse/create the venv here instead of a temporary one")
+    parser.add_argument("--no-install", action="store_true", help="benchmark what's already installed in --venv")
+    parser.add_argument("--find-links", nargs="*", default=[os.environ.get("PIP_FIND_LINKS", "wheelhouse")])
+    parser.add_argument("--extra", nargs="*", default=["numpy"], help="other requirements to install")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-execution-engine", dest="execution_engine", action="store_false")
+    parser.add_argument("-o", "--output", default="import_bench.json")
+    parser.add_argument("--compare", default=None, help="earlier JSON result to diff against")
+    args = parser.parse_args()
+
+    tmp = None
+    wheel = args.wheel
+    venv = args.venv
+    if venv is None:
+        tmp = tempfile.mkdtemp(prefix="bench_import")
+        venv = Path(tmp) / "venv"
+    try:
+        if not args.no_install:
+            wheel = wheel or pick_wheel("wheelhouse")
+            make_venv(venv, wheel, args.find_links, args.extra)
+        result = bench(venv_python(venv), args.repeat, args.execution_engine)
+        result["wheel"] = Path(wheel).name if wheel else None
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    Path(args.output).write_text(json.dumps(result, indent=2))
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(result, baseline)
+    print(f"IMPORT wrote {args.output}")
@@ -0,0 +1,129 @@
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from bench_threads import make_module_source  # noqa: E402
+
+PIPELINES = {
+    "canonicalize-cse": "builtin.module(func.func(canonicalize,cse),symbol-dce)",
+    "to-llvm": "builtin.module(func.func(canonicalize,cse),convert-arith-to-llvm,convert-func-to-llvm,reconcile-unrealized-casts)",
+}
+EXE = ".exe" if platform.system() == "Windows" else ""
+
+
+def unpack(path, dest):
+    # an install prefix as is, or the tools and headers of an mlir wheel
+    path = Path(path)
+    if path.is_dir():
+        return path / "mlir" if (path / "mlir" / "bin").is_dir() else path
+    with zipfile.ZipFile(path) as z:
+        for info in z.infolist():
+            if info.filename.startswith(("mlir/bin/", "mlir/include/")):
+                z.extract(info, dest)
+                # zipfile drops the permissions
+                mode = info.external_attr >> 16
+                if mode:
+                    (Path(dest) / info.filename).chmod(mode)
+    return Path(dest) / "mlir"
+
+
+def tblgen_jobs(prefix):
+    include = prefix / "include"
+    jobs = []
+    for td in sorted((include / "mlir" / "Dialect").rglob("*Ops.td")):
+        for gen in ["-gen-op-decls", "-gen-op-defs"]:
+            jobs.append((f"mlir-tblgen {gen} {td.relative_to(include).as_posix()}", ["mlir-tblgen", gen, "-I", str(include), str(td)]))
+    intrinsics = include / "llvm" / "IR" / "Intrinsics.td"
+    if intrinsics.exists():
+        jobs.append(
+            ("llvm-tblgen -gen-intrinsic-enums llvm/IR/Intrinsics.td", ["llvm-tblgen", "-gen-intrinsic-enums", "-I", str(include), str(intrinsics)])
+        )
+    return jobs
+
+
+def time_cmd(prefix, cmd, repeat, stdin=None):
+    exe = prefix / "bin" / (cmd[0] + EXE)
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = subprocess.run([str(exe), *cmd[1:]], input=stdin, capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        if res.returncode != 0:
+            raise RuntimeError(f"{' '.join(cmd)} failed:\n{res.stderr[-2000:]}")
+        best = min(best, elapsed)
+        out = res.stdout
+    return best, out
+
+
+def bench(prefix, module, tblgen_repeat, opt_repeat):
+    results, outputs = {}, {}
+    for name, cmd in tblgen_jobs(prefix):
+        results[name], outputs[name] = time_cmd(prefix, cmd, tblgen_repeat)
+    for name, pipeline in PIPELINES.items():
+        name = f"mlir-opt {name}"
+        results[name], outputs[name] = time_cmd(
+            prefix, ["mlir-opt", f"--pass-pipeline={pipeline}", "-mlir-disable-threading"], opt_repeat, module
+        )
+    return results, outputs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare tblgen and mlir-opt speed of two mlir builds (e.g. the perf wheel vs the default one)")
+    parser.add_argument("--baseline", required=True, help="mlir wheel or install prefix, e.g. the asserting build")
+    parser.add_argument("--candidate", required=True, help="mlir wheel or install prefix, e.g. the perf build")
+    parser.add_argument("--tblgen-repeat", type=int, default=3)
+    parser.add_argument("--opt-repeat", type=int, default=5)
+    parser.add_argument("--functions", type=int, default=200)
+    parser.add_argument("--ops", type=int, default=100)
+    parser.add_argument("-o", "--output", default="perf_bench.json")
+    args = parser.parse_args()
+
+    module = make_module_source(args.functions, args.ops)
+    tmp = tempfile.mkdtemp(prefix="bench_perf")
+    try:
+        timings, outputs = {}, {}
+        for which in ["baseline", "candidate"]:
+            prefix = unpack(getattr(args, which), Path(tmp) / which)
+            timings[which], outputs[which] = bench(prefix, module, args.tblgen_repeat, args.opt_repeat)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    rows = []
+    for name in timings["baseline"]:
+        if name not in timings["candidate"]:
+            continue
+        old, new = timings["baseline"][name], timings["candidate"][name]
+        # asserts off mustn't change what gets generated
+        same = outputs["baseline"][name] == outputs["candidate"][name]
+        rows.append({"name": name, "baseline_s": old, "candidate_s": new, "speedup": old / new, "same_output": same})
+
+    def total(prefix):
+        return sum(r[f"{prefix}_s"] for r in rows)
+
+    for group in ["mlir-tblgen", "llvm-tblgen", "mlir-opt"]:
+        group_rows = [r for r in rows if r["name"].startswith(group)]
+        if not group_rows:
+            continue
+        old = sum(r["baseline_s"] for r in group_rows)
+        new = sum(r["candidate_s"] for r in group_rows)
+        print(f"PERF {group} ({len(group_rows)} runs): {old:.2f}s -> {new:.2f}s, {old / new:.2f}x")
+    for r in sorted(rows, key=lambda r: r["baseline_s"], reverse=True)[:15]:
+        print(f"PERF {r['name']}: {r['baseline_s'] * 1000:.0f}ms -> {r['candidate_s'] * 1000:.0f}ms, {r['speedup']:.2f}x")
+    print(f"PERF total: {total('baseline'):.2f}s -> {total('candidate'):.2f}s, {total('baseline') / total('candidate'):.2f}x")
+
+    Path(args.output).write_text(
+        json.dumps({"baseline": str(args.baseline), "candidate": str(args.candidate), "results": rows}, indent=2)
+    )
+    differ = [r["name"] for r in rows if not r["same_output"]]
+    for name in differ:
+        print(f"PERF {name}: output differs between the builds", file=sys.stderr)
+    sys.exit(1 if differ else 0)
@@ -0,0 +1,192 @@
+import argparse
+import importlib
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from pathlib import Path
+
+HERE = Path(__file__).parent.resolve()
+CORPUS = HERE / "symbols_corpus.tsv"
+
+# per category cap when extracting a corpus; the rare ones are kept whole
+SAMPLE = {"llvm": 1500, "clang": 1500, "other": 600, "too_complex": 600, "not_nested": 600, "unmangled": 600}
+NESTED_MANGLING_RE = re.compile(r"_Z(T[VTIS])?(N.+)")
+
+
+def load_impl(path):
+    # imported under its real name from sys.path, so filter_symbols' process
+    # pool workers (fork or spawn) can unpickle _filter_chunk
+    path = Path(path).resolve()
+    sys.path.insert(0, str(path.parent))
+    return importlib.import_module(path.stem)
+
+
+def classify(impl, symbol):
+    # why should_keep_itanium_symbol keeps or drops a symbol, using only the
+    # public helpers so any implementation can be checked
+    if not symbol.startswith("_") and not symbol.startswith("."):
+        return "unmangled"
+    match = NESTED_MANGLING_RE.match(symbol)
+    if not match:
+        return "not_nested"
+    try:
+        names, _ = impl.parse_itanium_nested_name(match.group(2))
+    except impl.TooComplexName:
+        return "too_complex"
+    if not names:
+        return "unparsed"
+    if names[0][0] in ("4llvm", "5clang"):
+        return names[0][0][1:]
+    return "other"
+
+
+KEPT = {"unmangled", "unparsed", "llvm", "clang"}
+
+
+def read_corpus(path=CORPUS):
+    rows = []
+    for line in Path(path).read_text().splitlines():
+        if line and not line.startswith("#"):
+            category, symbol = line.split("\t", 1)
+            rows.append((category, symbol))
+    return rows
+
+
+def extract(impl, libs, out, seed=0):
+    # sample defined global symbols of LLVM/MLIR archives or shared libraries
+    nm = os.environ.get("NM", "nm")
+    by_category = defaultdict(set)
+    for lib in libs:
+        dynamic = ["-D"] if re.search(r"\.so(\.\d+)*$", lib) else []
+        res = subprocess.run(
+            [nm, "-P", "-g", "--defined-only", *dynamic, lib], capture_output=True, text=True, check=True
+        )
+        for line in res.stdout.splitlines():
+            s = impl.parse_symbol_line(line) if hasattr(impl, "parse_symbol_line") else line.split()[0]
+            if s:
+                by_category[classify(impl, s)].add(s)
+    rng = random.Random(seed)
+    rows = []
+    for category, symbols in sorted(by_category.items()):
+        symbols = sorted(symbols)
+        n = SAMPLE.get(category, len(symbols))
+        rows += [(category, s) for s in sorted(rng.sample(symbols, min(n, len(symbols))))]
+    with open(out, "w") as f:
+        f.write(f"# category<TAB>symbol, golden categories from {Path(impl.__file__).name}\n")
+        for category, s in rows:
+            f.write(f"{category}\t{s}\n")
+    print(f"wrote {len(rows)} symbols to {out}: {Counter(c for c, _ in rows)}", file=sys.stderr)
+
+
+def check_golden(impl, rows):
+    failures = []
+    for category, s in rows:
+        got = classify(impl, s)
+        kept = bool(impl.should_keep_itanium_symbol(s))
+        # the same symbol with the Mach-O/Win32 leading underscore
+        kept_decorated = bool(impl.should_keep_itanium_symbol("_" + s, calling_convention_decoration=True))
+        if got != category or kept != (category in KEPT) or kept_decorated != kept:
+            failures.append((s, category, got, kept, kept_decorated))
+    return failures
+
+
+def _demangler():
+    for tool in [os.environ.get("CXXFILT"), "llvm-cxxfilt", "c++filt"]:
+        if tool and shutil.which(tool):
+            return tool
+    return None
+
+
+def compare_demangler(rows, tool):
+    # the filter only looks at the outermost namespace; check that against a
+    # real demangler for the symbols it believes are llvm::/clang::
+    rows = [(c, s) for c, s in rows if c in {"llvm", "clang", "other"}]
+    res = subprocess.run([tool], input="\n".join(s for _, s in rows), capture_output=True, text=True)
+    prefix_re = re.compile(
+        r"^(?:(?:vtable|typeinfo|typeinfo name|VTT|construction vtable) for )?(?:[^(<]* )?(llvm|clang)::"
+    )
+    disagree = []
+    for (category, s), demangled in zip(rows, res.stdout.splitlines()):
+        m = prefix_re.match(demangled)
+        ns = m.group(1) if m else "other"
+        if ns != category:
+            disagree.append((s, category, demangled))
+    return len(rows), disagree
+
+
+def bench(impl, symbols, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for s in symbols:
+            impl.should_keep_itanium_symbol(s)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    for s in symbols:
+        impl.should_keep_itanium_symbol(s)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(symbols) / best, peak
+
+
+def bench_stream(impl, symbols, jobs):
+    if not hasattr(impl, "filter_symbols"):
+        return None
+    start = time.perf_counter()
+    for _ in impl.filter_symbols(iter(symbols), False, jobs):
+        pass
+    return len(symbols) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark and golden check of the symbols.py Itanium filter")
+    parser.add_argument("--impl", default=HERE / "symbols.py", help="symbols.py to test")
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--extra", nargs="*", default=[], help="more symbol lists to benchmark on (not checked)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--extract", nargs="+", metavar="LIB", help="regenerate the corpus from these libraries")
+    args = parser.parse_args()
+
+    impl = load_impl(args.impl)
+    if args.extract:
+        extract(impl, args.extract, args.corpus)
+        sys.exit(0)
+
+    rows = read_corpus(args.corpus)
+    failures = check_golden(impl, rows)
+    for s, category, got, kept, kept_decorated in failures[:20]:
+        print(f"GOLDEN {s}: expected {category}, got {got} (kept={kept}, decorated kept={kept_decorated})")
+    print(f"GOLDEN {len(rows) - len(failures)}/{len(rows)} match {Counter(c for c, _ in rows)}")
+
+    tool = _demangler()
+    if tool:
+        n, disagree = compare_demangler(rows, tool)
+        for s, category, demangled in disagree[:10]:
+            print(f"DEMANGLER {category} vs {tool}: {demangled}")
+        print(f"DEMANGLER {n - len(disagree)}/{n} agree with {tool} on the outermost namespace")
+    else:
+        print("DEMANGLER no c++filt/llvm-cxxfilt found, skipping")
+
+    symbols = [s for _, s in rows]
+    for extra in args.extra:
+        symbols += [l.strip() for l in open(extra) if l.strip()]
+    rate, peak = bench(impl, symbols, args.repeat)
+    print(f"BENCH should_keep_itanium_symbol: {rate:.0f} symbols/s over {len(symbols)} symbols, peak {peak / 1024:.0f}KiB traced")
+    for jobs in sorted({1, args.jobs}):
+        rate = bench_stream(impl, symbols, jobs)
+        if rate is not None:
+            print(f"BENCH filter_symbols jobs={jobs}: {rate:.0f} symbols/s")
+    if sys.platform != "win32":
+        import resource
+
+        # KiB on Linux, bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(f"BENCH max rss {rss // (2**20 if sys.platform == 'darwin' else 1024)}MiB")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,106 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+PIPELINE = "builtin.module(func.func(canonicalize,cse),symbol-dce)"
+
+
+def make_module_source(functions=20, ops=50):
+    # every function has redundant and foldable arith so canonicalize/cse
+    # have something to do
+    lines = []
+    for f in range(functions):
+        lines.append(f"func.func @f{f}(%a: i32, %b: i32) -> i32 {{")
+        lines.append("  %c0 = arith.constant 0 : i32")
+        prev = "%a"
+        for i in range(ops):
+            lines.append(f"  %x{i} = arith.addi {prev}, %b : i32")
+            lines.append(f"  %y{i} = arith.addi {prev}, %b : i32")
+            lines.append(f"  %z{i} = arith.addi %y{i}, %c0 : i32")
+            lines.append(f"  %w{i} = arith.muli %x{i}, %z{i} : i32")
+            prev = f"%w{i}"
+        lines.append(f"  return {prev} : i32")
+        lines.append("}")
+    return "\n".join(lines)
+
+
+def compile_module(source, pipeline=PIPELINE):
+    # one independent context per call, nothing is shared between workers
+    from mlir.ir import Context, Module
+    from mlir.passmanager import PassManager
+
+    with Context() as ctx:
+        # measure our threads, not MLIR's own thread pool
+        ctx.enable_multithreading(False)
+        module = Module.parse(source)
+        if not module.operation.verify():
+            raise RuntimeError("module failed to verify")
+        PassManager.parse(pipeline).run(module.operation)
+        return str(module)
+
+
+def _worker(args):
+    source, iters, reference = args
+    mismatches = 0
+    for _ in range(iters):
+        if compile_module(source) != reference:
+            mismatches += 1
+    return mismatches
+
+
+def _warm(_):
+    import mlir.ir  # noqa: F401
+
+
+def run(pool_cls, workers, source, iters, reference):
+    with pool_cls(workers) as pool:
+        # don't count process startup and the mlir import
+        list(pool.map(_warm, range(workers)))
+        start = time.perf_counter()
+        mismatches = sum(pool.map(_worker, [(source, iters, reference)] * workers))
+        elapsed = time.perf_counter() - start
+    return {"workers": workers, "seconds": elapsed, "modules_per_s": workers * iters / elapsed, "mismatches": mismatches}
+
+
+def gil_enabled():
+    return getattr(sys, "_is_gil_enabled", lambda: True)()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Thread vs process scaling of parse/verify/passes on independent MLIR contexts")
+    parser.add_argument("--workers", type=int, nargs="*", default=None, help="default: 1, 2, 4, ... up to the cpu count")
+    parser.add_argument("--iters", type=int, default=20, help="modules compiled per worker")
+    parser.add_argument("--functions", type=int, default=20)
+    parser.add_argument("--ops", type=int, default=50)
+    parser.add_argument("--no-processes", dest="processes", action="store_false")
+    parser.add_argument("-o", "--output", default="threads_bench.json")
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    workers = args.workers or sorted({1, cpus, *(2**i for i in range(1, 8) if 2**i < cpus)})
+    source = make_module_source(args.functions, args.ops)
+    reference = compile_module(source)
+
+    print(f"THREADS python {platform.python_version()}, GIL {'enabled' if gil_enabled() else 'disabled'}, {cpus} cpus")
+    results = {"python": platform.python_version(), "gil_enabled": gil_enabled(), "cpus": cpus, "threads": [], "processes": []}
+    modes = [("threads", ThreadPoolExecutor)] + ([("processes", ProcessPoolExecutor)] if args.processes else [])
+    for mode, pool_cls in modes:
+        for n in workers:
+            r = run(pool_cls, n, source, args.iters, reference)
+            base = results[mode][0]["modules_per_s"] if results[mode] else r["modules_per_s"]
+            r["efficiency"] = r["modules_per_s"] / (base * n)
+            results[mode].append(r)
+            print(
+                f"THREADS {mode} x{n}: {r['modules_per_s']:.1f} modules/s, "
+                f"efficiency {r['efficiency'] * 100:.0f}%, {r['mismatches']} mismatches"
+            )
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    if any(r["mismatches"] for mode, _ in modes for r in results[mode]):
+        print("THREADS output differed from the single-threaded reference", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,289 @@
+import argparse
+import ast
+import csv
+import hashlib
+import io
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+
+HERE = Path(__file__).parent.resolve()
+ROOT = HERE.parent
+
+# everything in the environment that changes what ends up in the mlir wheel;
+# DATETIME is deliberately left out, it only stamps the version (fetch
+# restamps a hit with the current one)
+KEY_ENV_VARS = [
+    "APPLY_PATCHES",
+    "ARCHFLAGS",
+    "BUILD_AMDGPU",
+    "BUILD_BOLT",
+    "BUILD_CUDA",
+    "BUILD_OPENMP",
+    "BUILD_PERF",
+    "BUILD_PGO",
+    "BUILD_VULKAN",
+    "CIBW_ARCHS",
+    "CIBW_MANYLINUX_AARCH64_IMAGE",
+    "CIBW_MANYLINUX_X86_64_IMAGE",
+    "CMAKE_ARGS",
+    "CMAKE_GENERATOR",
+    "DEBUG_CI_FAST_BUILD",
+    "DISTRIBUTION_PROFILE",
+    "FAST_LINK",
+    "FAST_LINK_LINKER",
+    "INSTALL_SIZE_BUDGET",
+    "LLVM_BOLT",
+    "LLVM_PROFDATA",
+    "LLVM_PROJECT_COMMIT",
+    "MACOSX_DEPLOYMENT_TARGET",
+    "MATRIX_OS",
+    "PGO_PROFDATA",
+    "RUN_TESTS",
+    "STRIP_DEBUG_DIR",
+    "STRIP_INSTALL_TREE",
+    "USE_CMAKE_NAMESPACES",
+]
+
+# files whose contents feed the build; setup.py imports from scripts/
+KEY_FILES = ["config.cmake", "setup.py", "pyproject.toml", "scripts/apply_patches.sh"]
+
+
+def imported_scripts(entry=ROOT / "setup.py", scripts=HERE):
+    # the scripts/ modules setup.py imports, transitively; benchmarks and
+    # release tooling never run in the build and stay out of the key.
+    # imports inside functions (e.g. restamp's) don't count
+    seen, todo = set(), [Path(entry)]
+    while todo:
+        tree = ast.parse(todo.pop().read_text())
+        nodes = list(tree.body)
+        while nodes:
+            node = nodes.pop()
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+                continue
+            if isinstance(node, ast.Import):
+                names = [a.name for a in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level:
+                names = [node.module]
+            else:
+                nodes.extend(ast.iter_child_nodes(node))
+                continue
+            for name in names:
+                p = Path(scripts) / (name.split(".")[0] + ".py")
+                if p.exists() and p not in seen:
+                    seen.add(p)
+                    todo.append(p)
+    return sorted(seen)
+
+
+def applied_patches(env=os.environ):
+    # keep in sync with scripts/apply_patches.sh
+    if env.get("APPLY_PATCHES", "true") != "true":
+        return []
+    patches = [
+        "add_td_to_mlirpythoncapi_headers",
+        "mscv",
+        "remove_openmp_dep_on_clang_and_export_async_symbols",
+    ]
+    if env.get("CIBW_ARCHS") == "wasm32":
+        patches.append("wasm_mlir_opt")
+    if env.get("USE_CMAKE_NAMESPACES") == "true":
+        patches.append("namespaces")
+    if env.get("MATRIX_OS") == "macos-13":
+        patches.append("mac_vec")
+    return patches
+
+
+def _first_line(cmd):
+    try:
+        res = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    out = (res.stdout or res.stderr).strip().splitlines()
+    return out[0] if out else None
+
+
+def manylinux_image(env=os.environ, root=ROOT):
+    # linux wheels are compiled in cibuildwheel's manylinux container, not
+    # with the runner's compiler; the image setting plus the cibuildwheel
+    # version (which pins the images' tags) identify that toolchain
+    arch = {"aarch64": "AARCH64", "arm64": "AARCH64"}.get(env.get("CIBW_ARCHS") or platform.machine(), "X86_64")
+    image = env.get(f"CIBW_MANYLINUX_{arch}_IMAGE")
+    if not image:
+        m = re.search(rf'^manylinux-{arch.lower()}-image = "(.*)"', (root / "pyproject.toml").read_text(), re.M)
+        image = m.group(1) if m else "default"
+    return f"{image} (cibuildwheel {_first_line(['cibuildwheel', '--version'])})"
+
+
+def toolchain(env=os.environ):
+    if platform.system() == "Windows":
+        cxx = env.get("CXX", "cl")
+        cxx_version = _first_line([cxx])
+    else:
+        cxx = env.get("CXX", "c++")
+        cxx_version = _first_line([cxx, "--version"])
+    return {
+        "system": platform.system(),
+        "machine": platform.machine(),
+        "cmake": _first_line(["cmake", "--version"]),
+        "cxx": cxx_version,
+    }
+
+
+def wheel_toolchain(env=os.environ):
+    # the key is computed on the runner, before cibuildwheel starts the container
+    if platform.system() == "Linux" and env.get("CIBW_ARCHS") != "wasm32":
+        return {
+            "system": platform.system(),
+            "machine": env.get("CIBW_ARCHS") or platform.machine(),
+            "cxx": manylinux_image(env),
+        }
+    return toolchain(env)
+
+
+def build_inputs(env=os.environ, root=ROOT):
+    return {
+        "env": {k: env.get(k, "") for k in KEY_ENV_VARS},
+        "files": {
+            str(p.relative_to(root)): hashlib.sha256(p.read_bytes()).hexdigest()
+            for p in [root / f for f in KEY_FILES if (root / f).exists()]
+            + imported_scripts(root / "setup.py", root / "scripts")
+        },
+        # a profile from an earlier run is an input like any other file
+        "pgo_profdata": hashlib.sha256(Path(env["PGO_PROFDATA"]).read_bytes()).hexdigest()
+        if env.get("PGO_PROFDATA") and Path(env["PGO_PROFDATA"]).exists()
+        else None,
+        "patches": {
+            p: hashlib.sha256((root / "patches" / f"{p}.patch").read_bytes()).hexdigest()
+            for p in applied_patches(env)
+        },
+        "toolchain": wheel_toolchain(env),
+    }
+
+
+def build_key(inputs):
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def cache_dir():
+    return Path(
+        os.environ.get("WHEEL_CACHE_DIR", Path.home() / ".cache" / "mlir-wheels-build")
+    )
+
+
+def _link_or_copy(src, dst):
+    dst.unlink(missing_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def restamp(wheel, datetime):
+    # a hit carries the DATETIME of the run that built it; give it this run's
+    # so it matches everything else published alongside it. members are
+    # copied still compressed, only METADATA and RECORD are rewritten
+    from assemble_native_tools import copy_raw
+    from split_wheel import _record_hash, read_wheel_info
+
+    wheel = Path(wheel)
+    with zipfile.ZipFile(wheel) as src:
+        dist_info, metadata, _, version, record = read_wheel_info(src)
+        public, plus, local = version.partition("+")
+        parts = public.split(".")
+        if len(parts) != 4 or parts[3] == datetime:
+            return wheel
+        new_version = ".".join(parts[:3] + [datetime]) + plus + local
+        old_prefix = dist_info[: -len(".dist-info")]
+        new_prefix = old_prefix[: -len(version)] + new_version
+        dist, _, tags = wheel.stem.partition(f"-{version}-")
+        out_path = wheel.with_name(f"{dist}-{new_version}-{tags}.whl")
+
+        def rename(name):
+            return new_prefix + name[len(old_prefix) :] if name.startswith(old_prefix + ".") else name
+
+        new_metadata = re.sub(r"^Version: .*$", f"Version: {new_version}", metadata, count=1, flags=re.M).encode()
+        rows = []
+        with zipfile.ZipFile(out_path, "w", zipfile.ZIP_DEFLATED) as out:
+            for info in src.infolist():
+                if info.filename == f"{dist_info}/RECORD":
+                    continue
+                if info.filename == f"{dist_info}/METADATA":
+                    out.writestr(rename(info.filename), new_metadata)
+                    rows.append((rename(info.filename), _record_hash(new_metadata), len(new_metadata)))
+                    continue
+                copy_raw(src, info, out, rename(info.filename))
+                if info.filename in record:
+                    rows.append((rename(info.filename), *record[info.filename]))
+            buf = io.StringIO()
+            csv.writer(buf, lineterminator="\n").writerows(rows + [(f"{new_prefix}.dist-info/RECORD", "", "")])
+            out.writestr(f"{new_prefix}.dist-info/RECORD", buf.getvalue())
+    wheel.unlink()
+    print(f"build cache restamped {wheel.name} -> {out_path.name}", file=sys.stderr)
+    return out_path
+
+
+def fetch(key, dest, datetime=None):
+    entry = cache_dir() / key
+    wheels = sorted(entry.glob("*.whl"))
+    if not wheels:
+        print(f"build cache miss {key}", file=sys.stderr)
+        return []
+    dest = Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+    for w in wheels:
+        _link_or_copy(w, dest / w.name)
+        print(f"build cache hit {key}: {w.name}", file=sys.stderr)
+    # touch for anyone pruning the cache by age
+    os.utime(entry)
+    fetched = [dest / w.name for w in wheels]
+    if datetime:
+        fetched = [restamp(w, datetime) for w in fetched]
+    return fetched
+
+
+def store(key, inputs, wheels):
+    entry = cache_dir() / key
+    tmp = entry.with_name(entry.name + f".tmp{os.getpid()}")
+    tmp.mkdir(parents=True, exist_ok=True)
+    for w in map(Path, wheels):
+        shutil.copy2(w, tmp / w.name)
+    (tmp / "inputs.json").write_text(
+        json.dumps({"created": time.time(), "inputs": inputs}, indent=2)
+    )
+    # publish atomically so a concurrent fetch never sees a partial entry
+    if entry.exists():
+        shutil.rmtree(entry)
+    tmp.rename(entry)
+    print(f"build cache stored {key}: {[Path(w).name for w in wheels]}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Content-addressed cache of built mlir wheels")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    key_parser = sub.add_parser("key", help="print the key for the current build inputs")
+    key_parser.add_argument("--explain", action="store_true")
+    fetch_parser = sub.add_parser("fetch", help="copy cached wheels to DEST, exit 1 on a miss")
+    fetch_parser.add_argument("dest")
+    store_parser = sub.add_parser("store", help="store wheels under the current key")
+    store_parser.add_argument("wheels", nargs="+")
+    args = parser.parse_args()
+
+    inputs = build_inputs()
+    key = build_key(inputs)
+    if args.cmd == "key":
+        print(key)
+        if args.explain:
+            print(json.dumps(inputs, indent=2, sort_keys=True))
+    elif args.cmd == "fetch":
+        sys.exit(0 if fetch(key, args.dest, os.environ.get("DATETIME")) else 1)
+    elif args.cmd == "store":
+        store(key, inputs, args.wheels)
@@ -0,0 +1,252 @@
+import os
+import platform
+import signal
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+MB = 1 << 20
+
+# rough peak RSS per job for an LLVM/MLIR Release+assertions build; the big
+# static links (clang, lld, mlir-opt) are what OOM the builders
+COMPILE_JOB_MB = int(os.environ.get("COMPILE_JOB_MEMORY_MB", 1500))
+LINK_JOB_MB = int(os.environ.get("LINK_JOB_MEMORY_MB", 8000))
+TABLEGEN_JOB_MB = int(os.environ.get("TABLEGEN_JOB_MEMORY_MB", 500))
+
+
+def _read_int(path):
+    try:
+        value = Path(path).read_text().split()[0]
+    except (OSError, IndexError):
+        return None
+    if value == "max":
+        return None
+    return int(value)
+
+
+def _cgroup_dirs(controller):
+    # cgroup v2 is "0::/path", v1 has one line per controller
+    try:
+        lines = Path("/proc/self/cgroup").read_text().splitlines()
+    except OSError:
+        return []
+    dirs = []
+    for line in lines:
+        _, controllers, path = line.split(":", 2)
+        if controllers == "":
+            root = Path("/sys/fs/cgroup")
+        elif controller in controllers.split(","):
+            root = Path("/sys/fs/cgroup") / controllers
+        else:
+            continue
+        d = root / path.lstrip("/")
+        # inside a container the path is usually not visible, the root is ours
+        while not d.exists() and d != root:
+            d = d.parent
+        dirs.append(d)
+    return dirs
+
+
+def cgroup_memory():
+    # (limit, usage) in bytes for the tightest memory cgroup we're in
+    best = (None, None)
+    for d in _cgroup_dirs("memory"):
+        while True:
+            limit = _read_int(d / "memory.max")
+            usage = _read_int(d / "memory.current")
+            if limit is None and usage is None:
+                limit = _read_int(d / "memory.limit_in_bytes")
+                usage = _read_int(d / "memory.usage_in_bytes")
+            # v1 reports "unlimited" as a page-rounded LONG_MAX
+            if limit is not None and limit < 1 << 60:
+                if best[0] is None or limit - (usage or 0) < best[0] - (best[1] or 0):
+                    best = (limit, usage)
+            if d.parent == d or d == Path("/sys/fs/cgroup") or d.parent.name == "cgroup":
+                break
+            d = d.parent
+    return best
+
+
+def meminfo():
+    info = {}
+    try:
+        for line in Path("/proc/meminfo").read_text().splitlines():
+            key, value = line.split(":", 1)
+            info[key] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    return info
+
+
+def available_memory():
+    info = meminfo()
+    avail = info.get("MemAvailable")
+    if avail is None:
+        try:
+            avail = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        except (ValueError, OSError, AttributeError):
+            return None
+    limit, usage = cgroup_memory()
+    if limit is not None:
+        avail = min(avail, limit - (usage or 0))
+    return max(avail, 0)
+
+
+def cpu_count():
+    try:
+        n = len(os.sched_getaffinity(0))
+    except AttributeError:
+        n = os.cpu_count() or 1
+    for d in _cgroup_dirs("cpu"):
+        try:
+            q, period = (d / "cpu.max").read_text().split()
+        except (OSError, ValueError):
+            # v1
+            q = _read_int(d / "cpu.cfs_quota_us")
+            period = _read_int(d / "cpu.cfs_period_us")
+            if q is None or period is None or int(q) < 0:
+                continue
+        if q != "max":
+            n = min(n, max(1, int(q) // int(period)))
+    return n
+
+
+def pick_jobs():
+    cpus = cpu_count()
+    avail = available_memory()
+    # ccache hits are cheap so oversubscribe like the old 2 * cpu_count default,
+    # but never past what fits in memory
+    compile_jobs = 2 * cpus
+    if avail is None:
+        link_jobs = tablegen_jobs = max(1, cpus // 4)
+    else:
+        compile_jobs = max(1, min(compile_jobs, avail // (COMPILE_JOB_MB * MB)))
+        link_jobs = max(1, min(cpus, avail // (LINK_JOB_MB * MB)))
+        tablegen_jobs = max(1, min(cpus, avail // (TABLEGEN_JOB_MB * MB)))
+    jobs = {"compile": compile_jobs, "link": link_jobs, "tablegen": tablegen_jobs}
+    print(
+        f"JOBS cpus={cpus} available_memory={None if avail is None else avail // MB}MB {jobs}",
+        file=sys.stderr,
+    )
+    return jobs
+
+
+def _proc_table():
+    procs = {}
+    for p in Path("/proc").iterdir():
+        if not p.name.isdigit():
+            continue
+        try:
+            stat = (p / "stat").read_text()
+        except OSError:
+            continue
+        # comm can contain spaces and parens
+        fields = stat[stat.rindex(")") + 2 :].split()
+        procs[int(p.name)] = {
+            "state": fields[0],
+            "ppid": int(fields[1]),
+            "start": int(fields[19]),
+            "rss": int(fields[21]) * os.sysconf("SC_PAGE_SIZE"),
+        }
+    return procs
+
+
+def _descendants(root, procs):
+    children = {}
+    for pid, info in procs.items():
+        children.setdefault(info["ppid"], []).append(pid)
+    out, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        for c in children.get(pid, []):
+            out.append(c)
+            stack.append(c)
+    return out, children
+
+
+class MemoryWatchdog(threading.Thread):
+    # ninja can't change -j mid-build, so when memory runs low we SIGSTOP the
+    # youngest leaf jobs (compilers/linkers) and SIGCONT them once it recovers;
+    # the biggest job is never stopped so the build always makes progress
+    def __init__(self, pid, low_mb=None, high_mb=None, interval=1.0):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.low = (low_mb or int(os.environ.get("BUILD_WATCHDOG_LOW_MB", 2048))) * MB
+        self.high = (high_mb or int(os.environ.get("BUILD_WATCHDOG_HIGH_MB", 4096))) * MB
+        self.interval = interval
+        self.stopped = []
+        self.peak_rss = 0
+        self.n_throttled = 0
+        self.done = threading.Event()
+
+    def _signal(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+            return True
+        except ProcessLookupError:
+            return False
+
+    def step(self):
+        procs = _proc_table()
+        tree, children = _descendants(self.pid, procs)
+        self.peak_rss = max(self.peak_rss, sum(procs[p]["rss"] for p in tree))
+        self.stopped = [p for p in self.stopped if p in procs]
+        avail = available_memory()
+        if avail is None:
+            return
+        running = [
+            p for p in tree if p not in children and procs[p]["state"] not in "TtZ"
+        ]
+        if self.stopped and (avail > self.high or not running):
+            # never let everything sit paused, that would hang the build
+            self._signal(self.stopped.pop(0), signal.SIGCONT)
+        elif avail < self.low and len(running) > 1:
+            biggest = max(running, key=lambda p: procs[p]["rss"])
+            victim = max(
+                (p for p in running if p != biggest), key=lambda p: procs[p]["start"]
+            )
+            if self._signal(victim, signal.SIGSTOP):
+                self.stopped.append(victim)
+                self.n_throttled += 1
+                print(
+                    f"WATCHDOG available={avail // MB}MB, pausing pid {victim}",
+                    file=sys.stderr,
+                )
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            try:
+                self.step()
+            except Exception as e:
+                print(f"WATCHDOG error {e!r}", file=sys.stderr)
+
+    def finish(self):
+        self.done.set()
+        self.join()
+        for p in self.stopped:
+            self._signal(p, signal.SIGCONT)
+        print(
+            f"WATCHDOG peak build rss={self.peak_rss // MB}MB, paused {self.n_throttled} jobs",
+            file=sys.stderr,
+        )
+
+
+def run_build(cmd, cwd=None, env=None, check=True, watchdog=True):
+    if not watchdog or platform.system() != "Linux" or not Path("/proc/self/stat").exists():
+        return subprocess.run(cmd, cwd=cwd, env=env, check=check)
+
+    proc = subprocess.Popen(cmd, cwd=cwd, env=env)
+    dog = MemoryWatchdog(proc.pid)
+    dog.start()
+    try:
+        returncode = proc.wait()
+    finally:
+        dog.finish()
+    if check and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+    return subprocess.CompletedProcess(cmd, returncode)
+
+
+if __name__ == "__main__":
+    pick_jobs()
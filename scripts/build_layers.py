@@ -0,0 +1,71 @@
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import build_cache
+
+# the variant flags only add backends/runners on top of the base build
+VARIANT_ENV_VARS = ["BUILD_AMDGPU", "BUILD_CUDA", "BUILD_OPENMP", "BUILD_VULKAN"]
+
+# cache entries config.cmake derives from the variant flags; set(... CACHE)
+# doesn't overwrite an existing entry so these have to be dropped (-U) when a
+# variant is configured on top of a base build tree
+VARIANT_CACHE_VARS = [
+    "CMAKE_CUDA_COMPILER",
+    "CMAKE_LIBRARY_PATH",
+    "CUDAToolkit_ROOT",
+    "LLVM_TARGETS_TO_BUILD",
+    "MLIR_ENABLE_CUDA_CONVERSIONS",
+    "MLIR_ENABLE_CUDA_RUNNER",
+    "MLIR_ENABLE_VULKAN_RUNNER",
+    "Vulkan_LIBRARY",
+]
+
+
+def is_variant(env=os.environ):
+    return any(env.get(v, 0) in {"1", "true", "True", "ON", "YES"} for v in VARIANT_ENV_VARS)
+
+
+def base_dir(root, env=os.environ):
+    base_env = {k: v for k, v in env.items() if k not in VARIANT_ENV_VARS}
+    return Path(root) / build_cache.build_key(build_cache.build_inputs(base_env))
+
+
+def _copy_tree(src, dst):
+    # mtimes have to survive the copy or ninja rebuilds everything; use
+    # copy-on-write clones where the filesystem supports them
+    dst.mkdir(parents=True, exist_ok=True)
+    if platform.system() == "Linux" and shutil.which("cp"):
+        subprocess.run(["cp", "-a", "--reflink=auto", f"{src}/.", str(dst)], check=True)
+    elif platform.system() == "Darwin":
+        subprocess.run(["cp", "-Rpc", f"{src}/.", str(dst)], check=True)
+    else:
+        shutil.copytree(src, dst, symlinks=True, dirs_exist_ok=True)
+
+
+def snapshot(build_dir, dest):
+    start = time.perf_counter()
+    dest = Path(dest)
+    tmp = dest.with_name(dest.name + f".tmp{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    _copy_tree(Path(build_dir), tmp)
+    if dest.exists():
+        shutil.rmtree(dest)
+    tmp.rename(dest)
+    print(
+        f"snapshotted {build_dir} to {dest} in {time.perf_counter() - start:.1f}s",
+        file=sys.stderr,
+    )
+
+
+def restore(src, build_dir):
+    start = time.perf_counter()
+    _copy_tree(Path(src), Path(build_dir))
+    print(
+        f"restored base build tree {src} into {build_dir} in {time.perf_counter() - start:.1f}s",
+        file=sys.stderr,
+    )
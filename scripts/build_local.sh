@@ -50,21 +50,23 @@ if [ x"$BUILD_CUDA" == x"true" ] && [ ! -f "$HERE/../cuda_12.2.0_535.54.03_linux
 fi
 
 export HOST_CCACHE_DIR="$(ccache --get-config cache_dir)"
-cibuildwheel "$HERE"/.. --platform "$machine"
+if ! python "$HERE/build_cache.py" fetch "$HERE/../wheelhouse"; then
+  # the wheelhouse keeps earlier runs' wheels, only cache what this run built
+  BUILD_STAMP="$(mktemp)"
+  cibuildwheel "$HERE"/.. --platform "$machine"
+  rename 's/cp311-cp311/py3-none/' "$HERE/../wheelhouse/"mlir-*whl
+  python "$HERE/build_cache.py" store $(find "$HERE/../wheelhouse" -maxdepth 1 -name 'mlir-*whl' -newer "$BUILD_STAMP")
+  rm -f "$BUILD_STAMP"
+fi
 
-rename 's/cp311-cp311/py3-none/' "$HERE/../wheelhouse/"mlir-*whl
+if [ x"$SPLIT_WHEELS" == x"true" ]; then
+  python "$HERE/split_wheel.py" "$HERE/../wheelhouse/"mlir-*whl -o "$HERE/../wheelhouse/components"
+fi
 
 if [ -d "$HERE/../wheelhouse/.ccache" ]; then
   cp -R "$HERE/../wheelhouse/.ccache/"* "$HOST_CCACHE_DIR/"
 fi
 
-for TOOL in "llvm-tblgen" "mlir-tblgen" "mlir-linalg-ods-yaml-gen" "mlir-pdll" "llvm-config" "FileCheck"; do
-  if [ x"$MATRIX_OS" == x"windows-2019" ]; then
-    TOOL="$TOOL.exe"
-  fi
-  unzip -j "$HERE/../wheelhouse/"mlir-*whl "mlir/bin/$TOOL" -d "$HERE/../native_tools/"
-done
-
 if [ x"$MATRIX_OS" == x"ubuntu-20.04" ]; then
   PLAT="manylinux_2_17"
 elif [ x"$MATRIX_OS" == x"macos-13" ]; then
@@ -74,9 +76,7 @@ elif [ x"$MATRIX_OS" == x"windows-2019" ]; then
 fi
 
 PLAT=${PLAT}_$(echo $ARCH | tr '[:upper:]' '[:lower:]')
-pushd "$HERE/../native_tools"
-python setup.py bdist_wheel --dist-dir ../wheelhouse --plat "$PLAT"
-popd
+python "$HERE/assemble_native_tools.py" "$HERE/../wheelhouse/"mlir-*whl --dist-dir "$HERE/../wheelhouse" --plat "$PLAT"
 
 cp -R "$HERE/../scripts" "$HERE/../python_bindings"
 cp -R "$HERE/../wheelhouse" "$HERE/../python_bindings"
@@ -84,3 +84,11 @@ cp -R "$HERE/../wheelhouse" "$HERE/../python_bindings"
 pushd "$HERE/../python_bindings"
 
 cibuildwheel --platform "$machine" --output-dir ../wheelhouse
+
+popd
+
+if [ "${BENCH_IMPORT:-false}" == "true" ]; then
+  pushd "$HERE/.."
+  python "$HERE/bench_import.py" -o wheelhouse/import_bench.json
+  popd
+fi
@@ -0,0 +1,251 @@
+import argparse
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from bench_perf import PIPELINES  # noqa: E402
+from bench_threads import make_module_source  # noqa: E402
+
+# what gets trained and (with BOLT) rewritten
+TOOLS = ["llvm-tblgen", "mlir-tblgen", "mlir-opt"]
+EXE = ".exe" if platform.system() == "Windows" else ""
+
+# mlir-tblgen generators by .td file name
+MLIR_GENERATORS = [
+    (re.compile(r"Ops\.td$"), ["-gen-op-decls", "-gen-op-defs", "-gen-dialect-decls", "-gen-op-doc"]),
+    (re.compile(r"(Attr|Attributes)\w*\.td$"), ["-gen-attrdef-decls", "-gen-attrdef-defs"]),
+    (re.compile(r"Types?\w*\.td$"), ["-gen-typedef-decls", "-gen-typedef-defs"]),
+    (re.compile(r"Enums?\w*\.td$"), ["-gen-enum-decls", "-gen-enum-defs"]),
+    (re.compile(r"Interfaces?\.td$"), ["-gen-op-interface-decls", "-gen-op-interface-defs"]),
+    (re.compile(r"Passes\.td$"), ["-gen-pass-decls"]),
+]
+LLVM_TARGET_GENERATORS = ["-gen-register-info", "-gen-instr-info", "-gen-subtarget", "-gen-asm-writer"]
+
+# -Wl,--emit-relocs keeps the relocations BOLT needs to move functions around
+BOLT_OPTIONS = [
+    "-reorder-blocks=ext-tsp",
+    "-reorder-functions=cdsort",
+    "-split-functions",
+    "-split-all-cold",
+    "-split-eh",
+    "-icf=1",
+    "-use-gnu-stack",
+    "-dyno-stats",
+]
+
+
+def find_tool(name, env_var, compiler=None):
+    # next to the compiler first so the profile format matches what reads it
+    if os.environ.get(env_var):
+        return os.environ[env_var]
+    if compiler:
+        sibling = Path(compiler).parent / (name + EXE)
+        if sibling.exists():
+            return str(sibling)
+    if platform.system() == "Darwin":
+        res = subprocess.run(["xcrun", "-f", name], capture_output=True, text=True)
+        if res.returncode == 0:
+            return res.stdout.strip()
+    found = shutil.which(name)
+    if found is None:
+        raise RuntimeError(f"couldn't find {name}, set {env_var}")
+    return found
+
+
+def cache_value(build_dir, var):
+    m = re.search(rf"^{var}:\w+=(.*)$", (Path(build_dir) / "CMakeCache.txt").read_text(), re.M)
+    return m.group(1) if m else None
+
+
+def training_jobs(source_dir, targets=()):
+    # (tool, args) over the in-tree .td files, the same kind of work tblgen
+    # does in downstream builds
+    source_dir = Path(source_dir)
+    mlir_include = source_dir / "mlir" / "include"
+    llvm_include = source_dir / "llvm" / "include"
+    jobs = []
+    for td in sorted((mlir_include / "mlir").rglob("*.td")):
+        for pattern, generators in MLIR_GENERATORS:
+            if pattern.search(td.name):
+                jobs += [("mlir-tblgen", [gen, "-I", str(mlir_include), "-I", str(td.parent), str(td)]) for gen in generators]
+                break
+    intrinsics = llvm_include / "llvm" / "IR" / "Intrinsics.td"
+    jobs += [("llvm-tblgen", [gen, "-I", str(llvm_include), str(intrinsics)]) for gen in ["-gen-intrinsic-enums", "-gen-intrinsic-impl"]]
+    for target in targets:
+        target_dir = source_dir / "llvm" / "lib" / "Target" / target
+        td = target_dir / f"{target}.td"
+        if td.exists():
+            jobs += [
+                ("llvm-tblgen", [gen, "-I", str(llvm_include), "-I", str(target_dir), str(td)])
+                for gen in LLVM_TARGET_GENERATORS
+            ]
+    return jobs
+
+
+def mlir_opt_inputs(source_dir):
+    # round-trip and canonicalization tests of the dialects plus a generated
+    # module big enough for the pass pipelines to dominate
+    test_dir = Path(source_dir) / "mlir" / "test" / "Dialect"
+    inputs = [(str(p), None) for p in sorted(test_dir.rglob("ops.mlir")) + sorted(test_dir.rglob("canonicalize.mlir"))]
+    return inputs + [("-", make_module_source(200, 100))]
+
+
+def train(bin_dir, source_dir, targets=(), jobs=None, env=None):
+    bin_dir = Path(bin_dir)
+    work = [
+        ([str(bin_dir / (tool + EXE)), *args, "-o", os.devnull], None) for tool, args in training_jobs(source_dir, targets)
+    ]
+    for path, stdin in mlir_opt_inputs(source_dir):
+        for pipeline in PIPELINES.values():
+            cmd = [str(bin_dir / ("mlir-opt" + EXE)), path, f"--pass-pipeline={pipeline}", "-o", os.devnull]
+            if stdin is None:
+                cmd += ["--split-input-file", "--allow-unregistered-dialect"]
+            work.append((cmd, stdin))
+
+    def run(item):
+        cmd, stdin = item
+        # some generator/file pairs don't apply, they still cover the parser
+        return subprocess.run(cmd, input=stdin, capture_output=True, text=True, env=env).returncode == 0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(jobs or os.cpu_count()) as pool:
+        ok = sum(pool.map(run, work))
+    print(f"PGO trained on {len(work)} runs ({ok} succeeded) in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    if not ok:
+        raise RuntimeError(f"every training run of {bin_dir} failed")
+    return len(work), ok
+
+
+def merge_profiles(profile_dir, out, llvm_profdata):
+    raw = sorted(Path(profile_dir).glob("*.profraw"))
+    if not raw:
+        raise RuntimeError(f"no .profraw files in {profile_dir}")
+    subprocess.run([llvm_profdata, "merge", f"-output={out}", *map(str, raw)], check=True)
+    print(f"PGO merged {len(raw)} raw profiles into {out}", file=sys.stderr)
+    return out
+
+
+def bolt_cmake_args(cmake_args, env=os.environ):
+    # BOLT needs the relocations kept in the linked tools. ELF only (ld64 has
+    # no --emit-relocs), and added to whatever linker flags are already there
+    if platform.system() != "Linux":
+        return []
+    flags = env.get("LDFLAGS", "")
+    # each element is one argument to cmake, the last definition wins
+    for arg in cmake_args:
+        m = re.match(r"^-DCMAKE_EXE_LINKER_FLAGS(:\w+)?=(.*)$", arg, re.S)
+        if m:
+            flags = m.group(2)
+    return [f"-DCMAKE_EXE_LINKER_FLAGS={(flags + ' ').lstrip()}-Wl,--emit-relocs"]
+
+
+def compiler_is_clang(compiler):
+    try:
+        res = subprocess.run([compiler, "--version"], capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return "clang" in res.stdout.lower()
+
+
+def instrumented_profile(sourcedir, cmake_args, build_args, work_dir):
+    # stage 1: instrumented tools, trained, merged into one .profdata for the
+    # real build. PGO_PROFDATA=<file> reuses an existing profile instead
+    if os.environ.get("PGO_PROFDATA"):
+        profile = Path(os.environ["PGO_PROFDATA"]).resolve()
+        if not profile.exists():
+            raise RuntimeError(f"PGO_PROFDATA={profile} doesn't exist")
+        return profile
+
+    work_dir = Path(work_dir)
+    build_dir = work_dir / "instrumented"
+    profile_dir = work_dir / "profiles"
+    shutil.rmtree(profile_dir, ignore_errors=True)
+    build_dir.mkdir(parents=True, exist_ok=True)
+    stage1_args = [a for a in cmake_args if not a.startswith("-B")] + [
+        f"-B{build_dir}",
+        "-DLLVM_BUILD_INSTRUMENTED=IR",
+        f"-DLLVM_PROFILE_DATA_DIR={profile_dir}",
+        # only the tools get built, no point in LTO-ing them
+        "-DLLVM_ENABLE_LTO=OFF",
+    ]
+    subprocess.run(["cmake", sourcedir, *stage1_args], cwd=build_dir, check=True)
+    # LLVM_BUILD_INSTRUMENTED=IR builds with gcc too, but only clang's
+    # instrumentation writes .profraw files; fail before the build, not after
+    cxx = cache_value(build_dir, "CMAKE_CXX_COMPILER")
+    if not cxx or not compiler_is_clang(cxx):
+        raise RuntimeError(f"BUILD_PGO needs clang, CMAKE_CXX_COMPILER is {cxx}")
+    # the build itself already runs the instrumented tblgens on the in-tree
+    # .td files, those profiles are kept
+    subprocess.run(["cmake", "--build", ".", "--target", *TOOLS, *build_args], cwd=build_dir, check=True)
+    targets = (cache_value(build_dir, "LLVM_TARGETS_TO_BUILD") or "").split(";")
+    train(build_dir / "bin", Path(sourcedir).parent, targets)
+    llvm_profdata = find_tool("llvm-profdata", "LLVM_PROFDATA", cache_value(build_dir, "CMAKE_CXX_COMPILER"))
+    return merge_profiles(profile_dir, work_dir / "mlir.profdata", llvm_profdata)
+
+
+def bolt(bin_dir, source_dir, work_dir, targets=(), tools=TOOLS):
+    # instrument the installed tools, train them, then rewrite them in place
+    # with the collected profile. ELF only
+    if platform.system() != "Linux":
+        print(f"BOLT is ELF only, skipping on {platform.system()}", file=sys.stderr)
+        return []
+    llvm_bolt = find_tool("llvm-bolt", "LLVM_BOLT")
+    merge_fdata = find_tool("merge-fdata", "MERGE_FDATA", llvm_bolt)
+    bin_dir, work_dir = Path(bin_dir), Path(work_dir)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    inst_dir = work_dir / "bin"
+    fdata_dir = work_dir / "fdata"
+    inst_dir.mkdir(parents=True)
+    fdata_dir.mkdir()
+    tools = [t for t in tools if (bin_dir / t).exists()]
+    for t in tools:
+        subprocess.run(
+            [
+                llvm_bolt,
+                str(bin_dir / t),
+                "-instrument",
+                f"-instrumentation-file={fdata_dir / t}.fdata",
+                "-instrumentation-file-append-pid",
+                "-o",
+                str(inst_dir / t),
+            ],
+            check=True,
+        )
+    train(inst_dir, source_dir, targets)
+    for t in tools:
+        fdata = sorted(fdata_dir.glob(f"{t}.fdata*"))
+        if not fdata:
+            print(f"BOLT no profile for {t}, leaving it alone", file=sys.stderr)
+            continue
+        merged = work_dir / f"{t}.fdata"
+        with open(merged, "w") as f:
+            subprocess.run([merge_fdata, *map(str, fdata)], stdout=f, check=True)
+        out = work_dir / f"{t}.bolt"
+        subprocess.run([llvm_bolt, str(bin_dir / t), "-o", str(out), f"-data={merged}", *BOLT_OPTIONS], check=True)
+        shutil.copymode(bin_dir / t, out)
+        os.replace(out, bin_dir / t)
+        print(f"BOLT optimized {bin_dir / t} with {len(fdata)} profiles", file=sys.stderr)
+    return tools
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the PGO/BOLT training corpus against a directory of tools")
+    parser.add_argument("bin_dir", help="directory with llvm-tblgen, mlir-tblgen and mlir-opt")
+    parser.add_argument("--source-dir", default="llvm-project")
+    parser.add_argument("--targets", nargs="*", default=["X86", "AArch64"])
+    parser.add_argument("-j", "--jobs", type=int, default=None)
+    parser.add_argument("--list", action="store_true", help="only print the tblgen runs")
+    args = parser.parse_args()
+
+    if args.list:
+        for tool, tool_args in training_jobs(args.source_dir, args.targets):
+            print(tool, *tool_args)
+        sys.exit(0)
+    train(args.bin_dir, args.source_dir, args.targets, args.jobs)
@@ -0,0 +1,274 @@
+import argparse
+import html
+import json
+import re
+import shutil
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+# first match wins; paths are relative to the llvm build dir
+PROJECT_PATTERNS = [
+    ("MLIR", re.compile(r"(^|/)tools/mlir/|(^|/)(bin|lib)/(lib)?(mlir|MLIR)")),
+    ("Clang", re.compile(r"(^|/)tools/clang/|(^|/)(bin|lib)/(lib)?(clang|Clang)")),
+    ("LLD", re.compile(r"(^|/)tools/lld/|(^|/)(bin|lib)/(lib)?lld|(^|/)bin/(ld\.lld|ld64\.lld|wasm-ld)")),
+]
+
+KIND_PATTERNS = [
+    ("compile", re.compile(r"\.(o|obj)$")),
+    ("tablegen", re.compile(r"\.inc$|\.inc\.d$")),
+    ("archive", re.compile(r"\.(a|lib)$")),
+    ("link", re.compile(r"(^|/)bin/[^/.]+$|\.(so|dylib|dll|exe)$")),
+]
+
+
+class PhaseTimer:
+    def __init__(self):
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+            print(f"PHASE {name}: {self.phases[name]:.1f}s", file=sys.stderr)
+
+
+def classify(output, patterns, default):
+    for name, pattern in patterns:
+        if pattern.search(output):
+            return name
+    return default
+
+
+def read_ninja_log(path):
+    # ninja appends to the log on every invocation and restarts its clock each
+    # time, so a run boundary is wherever the end times go backwards
+    runs = [[]]
+    last_end = 0
+    with open(path) as f:
+        header = f.readline()
+        if not re.match(r"# ninja log v\d+", header):
+            raise ValueError(f"{path} is not a ninja log")
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 4:
+                continue
+            start, end = int(fields[0]), int(fields[1])
+            if end < last_end and runs[-1]:
+                runs.append([])
+            last_end = end
+            cmdhash = fields[4] if len(fields) > 4 else fields[3]
+            runs[-1].append((start, end, fields[3], cmdhash))
+    return [r for r in runs if r]
+
+
+def group_edges(entries):
+    # one edge with several outputs gets one log line per output
+    edges = {}
+    for start, end, output, cmdhash in entries:
+        edge = edges.setdefault((start, end, cmdhash), [start, end, []])
+        edge[2].append(output)
+    return sorted(edges.values(), key=lambda e: (e[0], e[1]))
+
+
+def ninja_graph_deps(build_dir, target, ninja="ninja"):
+    # `ninja -t graph` emits graphviz; file nodes are boxes labelled with
+    # their path, edges with several ins/outs get an intermediate ellipse node
+    res = subprocess.run(
+        [ninja, "-C", str(build_dir), "-t", "graph", target],
+        capture_output=True,
+        text=True,
+    )
+    if res.returncode != 0:
+        return None, None
+    labels = {}
+    preds = defaultdict(list)
+    node_re = re.compile(r'^"(0x[0-9a-fA-F]+)" \[label="(.*?)"(, shape=ellipse)?\]$')
+    arrow_re = re.compile(r'^"(0x[0-9a-fA-F]+)" -> "(0x[0-9a-fA-F]+)"')
+    for line in res.stdout.splitlines():
+        m = arrow_re.match(line)
+        if m:
+            preds[m.group(2)].append(m.group(1))
+            continue
+        m = node_re.match(line)
+        if m and not m.group(3):
+            labels[m.group(1)] = m.group(2)
+    return labels, preds
+
+
+def critical_path(labels, preds, durations):
+    nodes = set(labels) | set(preds)
+    for ps in list(preds.values()):
+        nodes.update(ps)
+    succs = defaultdict(list)
+    indegree = {n: 0 for n in nodes}
+    for n, ps in preds.items():
+        indegree[n] = len(ps)
+        for p in ps:
+            succs[p].append(n)
+
+    weight = {n: durations.get(labels.get(n), 0) for n in nodes}
+    dist = {}
+    parent = {}
+    ready = [n for n, d in indegree.items() if d == 0]
+    while ready:
+        n = ready.pop()
+        best = max(preds.get(n, []), key=lambda p: dist[p], default=None)
+        dist[n] = weight[n] + (dist[best] if best is not None else 0)
+        parent[n] = best
+        for s in succs[n]:
+            indegree[s] -= 1
+            if indegree[s] == 0:
+                ready.append(s)
+    if not dist:
+        return 0, []
+
+    n = max(dist, key=dist.get)
+    total = dist[n]
+    steps = []
+    while n is not None:
+        if weight[n]:
+            steps.append({"output": labels[n], "seconds": weight[n] / 1000})
+        n = parent[n]
+    return total / 1000, steps[::-1]
+
+
+def parallelism_over_time(edges, wall_ms, n_samples=200):
+    bucket = max(1000, -(-wall_ms // n_samples))
+    busy = [0] * (wall_ms // bucket + 1)
+    for start, end, _ in edges:
+        t = start
+        while t < end:
+            b = t // bucket
+            nxt = min(end, (b + 1) * bucket)
+            busy[b] += nxt - t
+            t = nxt
+    return bucket / 1000, [round(b / bucket, 2) for b in busy]
+
+
+def analyze_run(entries, build_dir=None, target=None, ninja=None, top=50):
+    edges = group_edges(entries)
+    first = min(e[0] for e in edges)
+    wall_ms = max(e[1] for e in edges) - first
+    edges = [(s - first, e - first, outs) for s, e, outs in edges]
+
+    by_project = defaultdict(float)
+    by_kind = defaultdict(float)
+    durations = {}
+    for start, end, outs in edges:
+        secs = (end - start) / 1000
+        by_project[classify(outs[0], PROJECT_PATTERNS, "LLVM")] += secs
+        by_kind[classify(outs[0], KIND_PATTERNS, "other")] += secs
+        for o in outs:
+            durations[o] = end - start
+    cpu = sum(by_project.values())
+
+    slowest = sorted(edges, key=lambda e: e[1] - e[0], reverse=True)[:top]
+    bucket_secs, samples = parallelism_over_time(edges, wall_ms)
+
+    report = {
+        "edges": len(edges),
+        "wall_seconds": wall_ms / 1000,
+        "cpu_seconds": cpu,
+        "effective_parallelism": round(cpu / max(wall_ms / 1000, 1e-3), 2),
+        "by_project": dict(sorted(by_project.items(), key=lambda kv: -kv[1])),
+        "by_kind": dict(sorted(by_kind.items(), key=lambda kv: -kv[1])),
+        "slowest": [
+            {"output": outs[0], "seconds": (e - s) / 1000} for s, e, outs in slowest
+        ],
+        "critical_path": None,
+        "parallelism": {"bucket_seconds": bucket_secs, "samples": samples},
+    }
+
+    ninja = ninja or shutil.which("ninja")
+    if build_dir is not None and target is not None and ninja is not None:
+        labels, preds = ninja_graph_deps(build_dir, target, ninja)
+        if labels is not None:
+            secs, steps = critical_path(labels, preds, durations)
+            report["critical_path"] = {"seconds": secs, "steps": steps}
+    return report
+
+
+def render_html(report):
+    def table(rows, headers):
+        out = ["<table><tr>" + "".join(f"<th>{h}</th>" for h in headers) + "</tr>"]
+        for row in rows:
+            out.append(
+                "<tr>" + "".join(f"<td>{html.escape(str(c))}</td>" for c in row) + "</tr>"
+            )
+        out.append("</table>")
+        return "\n".join(out)
+
+    parts = [
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>build profile</title>",
+        "<style>body{font-family:sans-serif} td,th{padding:2px 8px;text-align:left}"
+        " td:last-child{text-align:right}</style></head><body>",
+        "<h2>Phases</h2>",
+        table([(k, f"{v:.1f}s") for k, v in report["phases"].items()], ["phase", "time"]),
+    ]
+    for i, run in enumerate(report["ninja_runs"]):
+        parts.append(
+            f"<h2>ninja run {i}</h2><p>{run['edges']} edges, wall {run['wall_seconds']:.0f}s, "
+            f"cpu {run['cpu_seconds']:.0f}s, effective parallelism {run['effective_parallelism']}</p>"
+        )
+        samples = run["parallelism"]["samples"]
+        peak = max(samples + [1])
+        points = " ".join(
+            f"{x * 800 / max(len(samples) - 1, 1):.1f},{200 - s * 200 / peak:.1f}"
+            for x, s in enumerate(samples)
+        )
+        parts.append(
+            f"<h3>parallelism over time (peak {peak}, {run['parallelism']['bucket_seconds']}s buckets)</h3>"
+            f"<svg width='800' height='200' style='border:1px solid #ccc'>"
+            f"<polyline fill='none' stroke='steelblue' points='{points}'/></svg>"
+        )
+        parts.append("<h3>cpu time by project</h3>")
+        parts.append(table([(k, f"{v:.1f}s") for k, v in run["by_project"].items()], ["project", "cpu"]))
+        parts.append("<h3>cpu time by kind</h3>")
+        parts.append(table([(k, f"{v:.1f}s") for k, v in run["by_kind"].items()], ["kind", "cpu"]))
+        if run["critical_path"]:
+            cp = run["critical_path"]
+            parts.append(f"<h3>critical path ({cp['seconds']:.1f}s)</h3>")
+            parts.append(table([(s["output"], f"{s['seconds']:.1f}s") for s in cp["steps"]], ["output", "time"]))
+        parts.append("<h3>slowest edges</h3>")
+        parts.append(table([(s["output"], f"{s['seconds']:.1f}s") for s in run["slowest"]], ["output", "time"]))
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def write_report(build_dir, out_dir, phases=None, target="install", ninja=None):
+    build_dir = Path(build_dir)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    report = {"phases": phases or {}, "ninja_runs": []}
+    ninja_log = build_dir / ".ninja_log"
+    if ninja_log.exists():
+        runs = read_ninja_log(ninja_log)
+        # the critical path only makes sense for the run that built (most of) the target
+        main = max(range(len(runs)), key=lambda i: len(runs[i]), default=None)
+        for i, run in enumerate(runs):
+            report["ninja_runs"].append(
+                analyze_run(run, *((build_dir, target) if i == main else (None, None)), ninja=ninja)
+            )
+    else:
+        print(f"no ninja log at {ninja_log}", file=sys.stderr)
+
+    (out_dir / "build_profile.json").write_text(json.dumps(report, indent=2))
+    (out_dir / "build_profile.html").write_text(render_html(report))
+    print(f"wrote build profile to {out_dir}", file=sys.stderr)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a ninja build from its .ninja_log")
+    parser.add_argument("build_dir")
+    parser.add_argument("-o", "--output-dir", default=None)
+    parser.add_argument("--target", default="install", help="target to compute the critical path for")
+    args = parser.parse_args()
+    write_report(args.build_dir, args.output_dir or args.build_dir, target=args.target)
@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+from collections import Counter, defaultdict
+from pathlib import Path
+
+# ccache 4.x: "[2024-01-16T10:08:11.591226 3419447] msg"
+# ccache 3.x: "[2019-10-24T10:51:49.386098 15470 ] msg"
+LOG_LINE_RE = re.compile(r"^\[\S+\s+(\d+)\s*\] ?(.*)$")
+DATE_TIME_RE = re.compile(r"Found (__DATE__|__TIME__|__TIMESTAMP__) in (.*)")
+CONFIG_RE = re.compile(r"^Config: \([^)]*\) (\w+) = (.*)$")
+
+# objects that missed on every one of at least this many builds get flagged
+ALWAYS_MISS_MIN_BUILDS = int(os.environ.get("CCACHE_ALWAYS_MISS_MIN_BUILDS", 3))
+# objects not compiled in this many builds are dropped from the history, so
+# it doesn't grow (and get saved with the CI cache) forever
+HISTORY_MAX_BUILDS = int(os.environ.get("CCACHE_ANALYZE_HISTORY_BUILDS", 10))
+
+
+def parse_log(path):
+    # one record per compiler invocation; pids get reused so a new record
+    # starts at every "=== CCACHE ... STARTED" banner
+    records = []
+    current = {}
+    config = {}
+    with open(path, errors="replace") as f:
+        for line in f:
+            m = LOG_LINE_RE.match(line.rstrip("\n"))
+            if not m:
+                continue
+            pid, msg = m.group(1), m.group(2)
+            if msg.startswith("=== CCACHE") and "STARTED" in msg:
+                current[pid] = {"results": [], "date_time": []}
+                records.append(current[pid])
+                continue
+            rec = current.get(pid)
+            if rec is None:
+                continue
+            if msg.startswith("Command line: "):
+                rec["command"] = msg[len("Command line: ") :]
+            elif msg.startswith("Working directory: "):
+                rec["cwd"] = msg[len("Working directory: ") :]
+            elif msg.startswith("Source file: "):
+                rec["source"] = msg[len("Source file: ") :]
+            elif msg.startswith("Object file: "):
+                rec["object"] = msg[len("Object file: ") :]
+            elif msg.startswith("Result: "):
+                rec["results"].append(msg[len("Result: ") :])
+            elif DATE_TIME_RE.match(msg):
+                rec["date_time"].append(DATE_TIME_RE.match(msg).group(1))
+            elif CONFIG_RE.match(msg):
+                k, v = CONFIG_RE.match(msg).groups()
+                config[k] = v
+    return [r for r in records if r.get("object") and r["results"]], config
+
+
+def outcome(rec):
+    # a direct mode miss followed by a preprocessed hit is still a hit
+    if any("hit" in r for r in rec["results"]):
+        return "hit"
+    if any("miss" in r for r in rec["results"]):
+        return "miss"
+    # called_for_link, unsupported_compiler_option, multiple_source_files ...
+    return rec["results"][-1]
+
+
+def split_command(command, cwd, base_dir):
+    try:
+        args = shlex.split(command)[1:]
+    except ValueError:
+        args = command.split()[1:]
+    defines = sorted(a for a in args if a.startswith("-D"))
+    others = [a for a in args if not a.startswith("-D")]
+    absolute = [
+        a
+        for a in others
+        if re.match(r"^(-I|-isystem|-iquote|-o|)/", a)
+        and not (base_dir and re.sub(r"^-\w+", "", a).startswith(base_dir))
+    ]
+    # the same flags relative to the working dir, to tell a moved tree from a
+    # real flag change
+    relative = [a.replace(cwd, "<cwd>") if cwd else a for a in others]
+    return defines, others, relative, absolute
+
+
+def target_dir(obj):
+    # lib/Support/CMakeFiles/LLVMSupport.dir/Path.cpp.o -> lib/Support
+    return obj.split("/CMakeFiles/")[0] if "/CMakeFiles/" in obj else str(Path(obj).parent)
+
+
+def classify_miss(rec, prev, defines, others, relative, absolute):
+    if rec["date_time"]:
+        return "date_time", sorted(set(rec["date_time"]))
+    if prev is None:
+        return "new", None
+    if prev["defines"] != defines:
+        changed = sorted(set(prev["defines"]).symmetric_difference(defines))
+        return "changed_defines", changed
+    if prev["flags"] != others:
+        if prev["relative"] == relative or prev.get("cwd") != rec.get("cwd"):
+            return "absolute_path", absolute[:5]
+        return "changed_flags", sorted(set(prev["flags"]).symmetric_difference(others))[:10]
+    if prev.get("cwd") != rec.get("cwd"):
+        return "absolute_path", [rec.get("cwd")]
+    # same command line, so the source or one of its headers changed
+    return "preprocessor_change", None
+
+
+def ccache_dir():
+    try:
+        return subprocess.run(
+            ["ccache", "--get-config", "cache_dir"], capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def history_path():
+    if "CCACHE_ANALYZE_HISTORY" in os.environ:
+        return Path(os.environ["CCACHE_ANALYZE_HISTORY"])
+    # keep it next to the cache so it's carried between CI runs with it
+    d = ccache_dir()
+    return Path(d) / "analyze_history.json" if d else None
+
+
+def load_history(path):
+    # {"build": <builds analyzed>, "objects": {object: {...}}}
+    if path is None or not Path(path).exists():
+        return {"build": 0, "objects": {}}
+    data = json.loads(Path(path).read_text())
+    if "objects" not in data:
+        # the old format, just the objects
+        return {"build": 0, "objects": data}
+    return data
+
+
+def prune_history(history, max_builds=HISTORY_MAX_BUILDS):
+    build = history["build"]
+    stale = [obj for obj, e in history["objects"].items() if build - e.get("last_build", 0) >= max_builds]
+    for obj in stale:
+        del history["objects"][obj]
+    return len(stale)
+
+
+def analyze(log, history=None, top=50):
+    records, config = parse_log(log)
+    history = history if history is not None else {"build": 0, "objects": {}}
+    history["build"] += 1
+    objects = history["objects"]
+    base_dir = config.get("base_dir") or os.environ.get("CCACHE_BASEDIR", "")
+
+    outcomes = Counter()
+    reasons = Counter()
+    by_dir = defaultdict(Counter)
+    misses = []
+    n_absolute = 0
+    for rec in records:
+        obj = rec["object"]
+        res = outcome(rec)
+        outcomes[res if res in {"hit", "miss"} else "uncacheable"] += 1
+        d = target_dir(obj)
+        by_dir[d][res if res in {"hit", "miss"} else "uncacheable"] += 1
+        prev = objects.get(obj)
+        defines, others, relative, absolute = split_command(rec.get("command", ""), rec.get("cwd", ""), base_dir)
+        if res == "miss":
+            reason, detail = classify_miss(rec, prev, defines, others, relative, absolute)
+            reasons[reason] += 1
+            by_dir[d][reason] += 1
+            n_absolute += bool(absolute)
+            misses.append({"object": obj, "reason": reason, "detail": detail})
+        elif res != "hit":
+            misses.append({"object": obj, "reason": f"uncacheable: {res}", "detail": None})
+        entry = objects.setdefault(obj, {"builds": 0, "misses": 0, "streak": 0})
+        entry["builds"] += 1
+        entry["misses"] += res == "miss"
+        entry["streak"] = entry["streak"] + 1 if res == "miss" else 0
+        entry.update(defines=defines, flags=others, relative=relative, cwd=rec.get("cwd"), last_build=history["build"])
+
+    always_miss = sorted(
+        obj
+        for obj, e in objects.items()
+        if e["streak"] >= ALWAYS_MISS_MIN_BUILDS and e["streak"] == e["builds"]
+    )
+    total = sum(outcomes.values())
+    dirs = sorted(by_dir.items(), key=lambda kv: -kv[1]["miss"])
+    return {
+        "invocations": total,
+        "hit_rate": round(outcomes["hit"] / total, 4) if total else None,
+        "outcomes": dict(outcomes),
+        "miss_reasons": dict(reasons.most_common()),
+        "misses_with_absolute_paths": n_absolute,
+        "base_dir": base_dir,
+        "by_directory": {d: dict(c) for d, c in dirs[:top] if c["miss"] or c["uncacheable"]},
+        "always_miss": always_miss,
+        "misses": misses,
+    }
+
+
+def print_summary(report, top=20):
+    print(
+        f"CCACHE {report['invocations']} compiles, hit rate {report['hit_rate']}, {report['outcomes']}",
+        file=sys.stderr,
+    )
+    for reason, n in report["miss_reasons"].items():
+        print(f"CCACHE miss reason {reason}: {n}", file=sys.stderr)
+    if report["misses_with_absolute_paths"] and not report["base_dir"]:
+        print(
+            f"CCACHE {report['misses_with_absolute_paths']} misses had absolute paths "
+            f"in the command line and base_dir is not set",
+            file=sys.stderr,
+        )
+    for d, c in list(report["by_directory"].items())[:top]:
+        print(f"CCACHE {d}: {c}", file=sys.stderr)
+    for obj in report["always_miss"][:top]:
+        print(f"CCACHE always misses: {obj}", file=sys.stderr)
+
+
+def write_report(log, out_dir, history_file=None):
+    log = Path(log)
+    if not log.exists():
+        print(f"no ccache log at {log}", file=sys.stderr)
+        return None
+    history_file = history_file or history_path()
+    history = load_history(history_file)
+    report = analyze(log, history)
+    report["history_pruned"] = prune_history(history)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / "ccache_report.json").write_text(json.dumps(report, indent=2))
+    if history_file is not None:
+        tmp = Path(history_file).with_name(Path(history_file).name + f".tmp{os.getpid()}")
+        tmp.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(json.dumps(history))
+        tmp.replace(history_file)
+    print_summary(report)
+    print(f"wrote ccache report to {out_dir / 'ccache_report.json'}", file=sys.stderr)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Group ccache misses by reason and directory")
+    parser.add_argument("log", help="ccache log file (CCACHE_LOGFILE)")
+    parser.add_argument("-o", "--output-dir", default=".")
+    parser.add_argument("--history", default=None, help="per object history carried between builds")
+    args = parser.parse_args()
+    write_report(args.log, args.output_dir, args.history)
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+import build_cache
+
+# results of check_include_file/check_symbol_exists/check_*_source_compiles/
+# check_*_compiler_flag etc. end up as INTERNAL cache entries named like these
+PROBE_RE = re.compile(
+    r"^(HAVE_|HAS_|C_SUPPORTS_|CXX_SUPPORTS_|LINKER_SUPPORTS_|SUPPORTS_|C_HAS_|CXX_HAS_"
+    r"|CMAKE_HAVE_|COMPILER_RT_HAS_|LLVM_HAS_|LLVM_LIBSTDCXX_|LLVM_COMPILER_|LLVM_LINKER_)\w+$"
+)
+CACHE_LINE_RE = re.compile(r"^([A-Za-z_][\w.+-]*):INTERNAL=(.*)$")
+
+# these change the outcome of the probes
+KEY_ENV_VARS = [
+    "CC",
+    "CXX",
+    "CFLAGS",
+    "CXXFLAGS",
+    "LDFLAGS",
+    "CIBW_ARCHS",
+    "CMAKE_ARGS",
+    "MACOSX_DEPLOYMENT_TARGET",
+    # setup.py adds the linker, ar, LTO and profile flags of these after CMAKE_ARGS
+    "BUILD_BOLT",
+    "BUILD_PERF",
+    "BUILD_PGO",
+    "FAST_LINK",
+    "FAST_LINK_LINKER",
+]
+
+
+def _output(cmd):
+    try:
+        return subprocess.run(cmd, capture_output=True, text=True, timeout=60).stdout.strip()
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+
+
+def sysroot(env=os.environ):
+    if "SDKROOT" in env:
+        return env["SDKROOT"]
+    if platform.system() == "Darwin":
+        return _output(["xcrun", "--show-sdk-path"])
+    if platform.system() == "Linux":
+        return _output([env.get("CXX", "c++"), "-print-sysroot"])
+    return ""
+
+
+def toolchain_key(config_file, env=os.environ):
+    inputs = {
+        "toolchain": build_cache.toolchain(env),
+        "sysroot": sysroot(env),
+        "env": {k: env.get(k, "") for k in KEY_ENV_VARS},
+        "config": hashlib.sha256(Path(config_file).read_bytes()).hexdigest(),
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def read_probes(cache_txt):
+    probes = {}
+    for line in Path(cache_txt).read_text().splitlines():
+        m = CACHE_LINE_RE.match(line)
+        if m and PROBE_RE.match(m.group(1)) and m.group(2) in {"", "0", "1"}:
+            probes[m.group(1)] = m.group(2)
+    return probes
+
+
+def seed_file(root, config_file, env=os.environ):
+    return Path(root) / toolchain_key(config_file, env) / "probes.cmake"
+
+
+def seed_args(root, config_file, env=os.environ):
+    seed = seed_file(root, config_file, env)
+    if not seed.exists():
+        print(f"configure cache miss {seed.parent.name}", file=sys.stderr)
+        return []
+    print(f"configure cache hit {seed.parent.name}", file=sys.stderr)
+    return [f"-C {seed}"]
+
+
+def update(root, config_file, build_dir, env=os.environ):
+    cache_txt = Path(build_dir) / "CMakeCache.txt"
+    if not cache_txt.exists():
+        return
+    seed = seed_file(root, config_file, env)
+    seed.parent.mkdir(parents=True, exist_ok=True)
+    probes = {}
+    # merge so that probes only some variants run accumulate
+    if seed.with_suffix(".json").exists():
+        probes = json.loads(seed.with_suffix(".json").read_text())
+    probes.update(read_probes(cache_txt))
+    for path, text in [
+        (seed.with_suffix(".json"), json.dumps(probes, indent=2, sort_keys=True)),
+        (seed, "".join(f'set({k} "{v}" CACHE INTERNAL "")\n' for k, v in sorted(probes.items()))),
+    ]:
+        tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+        tmp.write_text(text)
+        tmp.replace(path)
+    print(f"configure cache stored {len(probes)} probe results in {seed}", file=sys.stderr)
+
+
+def _read_variables(path):
+    out = {}
+    if path.exists():
+        for line in path.read_text().splitlines():
+            name, _, value = line.partition("=")
+            out[name] = value
+    return out
+
+
+def print_variables_diff(build_dir):
+    # config.cmake writes config_variables.txt when PRINT_CONFIG_VARIABLES=DIFF
+    current = Path(build_dir) / "config_variables.txt"
+    previous = current.with_suffix(".prev.txt")
+    if not current.exists():
+        return
+    new, old = _read_variables(current), _read_variables(previous)
+    if not old:
+        print(f"CONFIG VARIABLES: {len(new)} (no previous configure to diff against)", file=sys.stderr)
+    else:
+        for name in sorted(set(new) | set(old)):
+            if name not in old:
+                print(f"CONFIG VARIABLES + {name}={new[name]}", file=sys.stderr)
+            elif name not in new:
+                print(f"CONFIG VARIABLES - {name}={old[name]}", file=sys.stderr)
+            elif old[name] != new[name]:
+                print(f"CONFIG VARIABLES ~ {name}={old[name]} -> {new[name]}", file=sys.stderr)
+    current.replace(previous)
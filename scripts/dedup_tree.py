@@ -0,0 +1,155 @@
+import argparse
+import base64
+import csv
+import hashlib
+import io
+import os
+import re
+import sys
+import time
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+SHARED_LIB_RE = re.compile(r"\.(so(\.\d+)*|dylib|dll|pyd)$")
+
+
+def sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _files(root, pattern=None):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            p = Path(dirpath) / name
+            if p.is_symlink() or (pattern is not None and not pattern.search(name)):
+                continue
+            yield p
+
+
+def _hash_all(paths, jobs=None):
+    # hashlib releases the GIL for large updates
+    with ThreadPoolExecutor(jobs or min(32, (os.cpu_count() or 1) * 2)) as pool:
+        return dict(zip(paths, pool.map(sha256, paths)))
+
+
+def find_duplicates(root, pattern=None):
+    # only files that share a size with another file get hashed
+    by_size = defaultdict(list)
+    seen_inodes = set()
+    for p in _files(root, pattern):
+        st = p.stat()
+        if st.st_size == 0 or (st.st_dev, st.st_ino) in seen_inodes:
+            continue
+        seen_inodes.add((st.st_dev, st.st_ino))
+        by_size[st.st_size].append(p)
+    candidates = [p for ps in by_size.values() if len(ps) > 1 for p in ps]
+    groups = defaultdict(list)
+    for p, digest in _hash_all(candidates).items():
+        groups[(p.stat().st_size, digest)].append(p)
+    return sorted(
+        ([size, sorted(ps)] for (size, _), ps in groups.items() if len(ps) > 1),
+        key=lambda g: -g[0] * (len(g[1]) - 1),
+    )
+
+
+def symlink_copies(root):
+    # symlinks to files are followed when the wheel is zipped, so every one of
+    # them is another full copy in the wheel (libFoo.so -> libFoo.so.19 ...)
+    out = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            p = Path(dirpath) / name
+            if p.is_symlink() and p.is_file():
+                out.append((p, p.stat().st_size))
+    return sorted(out, key=lambda x: -x[1])
+
+
+def report(root, top=20):
+    # report only: replacing copies with hard or symbolic links doesn't make
+    # the wheel any smaller, zip stores every path (and every followed
+    # symlink) as a full copy
+    start = time.perf_counter()
+    root = Path(root)
+    groups = find_duplicates(root)
+    duplicated = sum(size * (len(paths) - 1) for size, paths in groups)
+    for size, paths in groups[:top]:
+        print(
+            f"DEDUP {len(paths)} x {size} bytes: {[str(p.relative_to(root)) for p in paths]}",
+            file=sys.stderr,
+        )
+    links = symlink_copies(root)
+    print(
+        f"DEDUP {len(groups)} groups of identical files in {root}, {duplicated / 2**20:.1f}MB duplicated; "
+        f"{len(links)} symlinks that the wheel stores as {sum(s for _, s in links) / 2**20:.1f}MB of copies; "
+        f"in {time.perf_counter() - start:.1f}s",
+        file=sys.stderr,
+    )
+    return duplicated
+
+
+def _wheel_hashes(wheel, pattern):
+    with zipfile.ZipFile(wheel) as zf:
+        record = next(n for n in zf.namelist() if n.endswith(".dist-info/RECORD"))
+        rows = csv.reader(io.TextIOWrapper(zf.open(record), encoding="utf-8"))
+        out = {}
+        for path, digest, size in rows:
+            if digest and pattern.search(path.rsplit("/", 1)[-1]):
+                algo, _, b64 = digest.partition("=")
+                if algo == "sha256":
+                    out[path] = (int(size), base64.urlsafe_b64decode(b64 + "==").hex())
+        return out
+
+
+def _tree_hashes(root, pattern):
+    paths = list(_files(root, pattern))
+    return {
+        str(p.relative_to(root)): (p.stat().st_size, digest)
+        for p, digest in _hash_all(paths).items()
+    }
+
+
+def hashes(tree_or_wheel, pattern=SHARED_LIB_RE):
+    if str(tree_or_wheel).endswith(".whl"):
+        return _wheel_hashes(tree_or_wheel, pattern)
+    return _tree_hashes(Path(tree_or_wheel), pattern)
+
+
+def cross_check(a, b, pattern=SHARED_LIB_RE):
+    # runtime libraries that ship in both the mlir and the bindings wheels
+    by_content = defaultdict(list)
+    for path, key in hashes(a, pattern).items():
+        by_content[key].append(path)
+    both = []
+    for path, key in sorted(hashes(b, pattern).items()):
+        if key in by_content:
+            both.append((path, by_content[key], key[0]))
+    for path, others, size in both:
+        print(f"DEDUP in both: {path} == {others} ({size / 2**20:.1f}MB)", file=sys.stderr)
+    print(
+        f"DEDUP {len(both)} shared libraries, {sum(s for *_, s in both) / 2**20:.1f}MB, "
+        f"ship in both {a} and {b}",
+        file=sys.stderr,
+    )
+    return both
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report identical files in an install tree or across wheels")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    tree_parser = sub.add_parser("tree")
+    tree_parser.add_argument("root")
+    cross_parser = sub.add_parser("cross", help="shared libraries present in both trees/wheels")
+    cross_parser.add_argument("a")
+    cross_parser.add_argument("b")
+    args = parser.parse_args()
+    if args.cmd == "tree":
+        report(args.root)
+    else:
+        cross_check(args.a, args.b)
@@ -0,0 +1,147 @@
+import argparse
+import datetime
+import hashlib
+import json
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# just enough of the GitHub releases API for gh_releases.py: tag lookup, paged
+# asset listing with ETags, asset deletion and (optionally) rate limiting
+
+
+def generate_assets(n, days=120, seed=0):
+    rng = random.Random(seed)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    variants = ["", "cuda.", "vulkan.", "openmp.", "perf.", "cuda.perf."]
+    platforms = ["manylinux_2_27_x86_64", "manylinux_2_28_aarch64", "macosx_12_0_arm64", "win_amd64"]
+    assets = []
+    for i in range(n):
+        created = now - datetime.timedelta(days=rng.uniform(0, days))
+        commit = hashlib.sha1(str(i).encode()).hexdigest()[:8]
+        date = created.strftime("%Y%m%d%H")
+        if i % 50 == 0:
+            # pinned by default
+            name = f"llvmorg-15.0.7-{commit}-{rng.choice(platforms)}.tar.xz"
+        else:
+            dist = rng.choice(["mlir", "mlir_python_bindings", "mlir_native_tools"])
+            python = "py3-none" if dist != "mlir_python_bindings" else rng.choice(["cp311-cp311", "cp312-abi3"])
+            name = f"{dist}-20.0.0.{date}+{rng.choice(variants)}{commit}-{python}-{rng.choice(platforms)}.whl"
+        assets.append(
+            {"id": 1000 + i, "name": name, "created_at": created.strftime("%Y-%m-%dT%H:%M:%SZ"), "size": rng.randint(1, 500) << 20}
+        )
+    return assets
+
+
+class State:
+    def __init__(self, releases, rate_limit_every=0):
+        # {(repo, release id): {"tag": ..., "assets": [...]}}
+        self.releases = releases
+        self.rate_limit_every = rate_limit_every
+        self.requests = self.not_modified = self.deleted = self.limited = 0
+        self.lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=None, headers=()):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for k, v in headers:
+            self.send_header(k, v)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _limited(self):
+        s = self.state
+        with s.lock:
+            s.requests += 1
+            if s.rate_limit_every and s.requests % s.rate_limit_every == 0:
+                s.limited += 1
+                self._send(403, {"message": "You have exceeded a secondary rate limit."}, [("Retry-After", "0")])
+                return True
+        return False
+
+    def do_GET(self):
+        if self._limited():
+            return
+        url = urlparse(self.path)
+        m = re.match(r"^/repos/([^/]+/[^/]+)/releases/tags/(.+)$", url.path)
+        if m:
+            for (repo, release_id), r in self.state.releases.items():
+                if repo == m.group(1) and r["tag"] == m.group(2):
+                    return self._send(200, {"id": release_id, "tag_name": r["tag"]})
+            return self._send(404, {"message": "Not Found"})
+        m = re.match(r"^/repos/([^/]+/[^/]+)/releases/(\d+)/assets$", url.path)
+        if not m or (m.group(1), int(m.group(2))) not in self.state.releases:
+            return self._send(404, {"message": "Not Found"})
+        q = parse_qs(url.query)
+        per_page = min(int(q.get("per_page", ["30"])[0]), 100)
+        page = int(q.get("page", ["1"])[0])
+        with self.state.lock:
+            assets = self.state.releases[(m.group(1), int(m.group(2)))]["assets"]
+            body = assets[(page - 1) * per_page : page * per_page]
+        etag = '"' + hashlib.sha256(json.dumps(body).encode()).hexdigest()[:32] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            with self.state.lock:
+                self.state.not_modified += 1
+            return self._send(304, headers=[("ETag", etag)])
+        self._send(200, body, [("ETag", etag)])
+
+    def do_DELETE(self):
+        if self._limited():
+            return
+        m = re.match(r"^/repos/([^/]+/[^/]+)/releases/assets/(\d+)$", self.path)
+        if m:
+            with self.state.lock:
+                for (repo, _), r in self.state.releases.items():
+                    if repo != m.group(1):
+                        continue
+                    for i, a in enumerate(r["assets"]):
+                        if a["id"] == int(m.group(2)):
+                            del r["assets"][i]
+                            self.state.deleted += 1
+                            return self._send(204)
+        self._send(404, {"message": "Not Found"})
+
+
+def serve(state, port=0):
+    handler = type("BoundHandler", (Handler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the GitHub releases API, for gh_releases.py")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--assets", type=int, default=5000, help="generated assets per release")
+    parser.add_argument("--fixture", default=None, help="JSON list of {repo, id, tag, assets} instead")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth request with a 403")
+    args = parser.parse_args()
+
+    if args.fixture:
+        releases = {(r["repo"], r["id"]): r for r in json.load(open(args.fixture))}
+    else:
+        releases = {
+            ("makslevental/wheels", 113028511): {"tag": "latest", "assets": generate_assets(args.assets, seed=1)},
+            ("makslevental/mlir-wheels", 111725799): {"tag": "latest", "assets": generate_assets(args.assets, seed=2)},
+        }
+    state = State(releases, args.rate_limit_every)
+    server = serve(state, args.port)
+    print(f"serving on http://127.0.0.1:{server.server_port}, run gh_releases.py --api-url http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print(
+            f"{state.requests} requests, {state.not_modified} not modified, "
+            f"{state.deleted} deleted, {state.limited} rate limited"
+        )
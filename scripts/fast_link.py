@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+import build_profile  # noqa: E402
+
+LINKERS = ["mold", "lld"]
+THIN_MAGIC = b"!<thin>\n"
+# LLVM sets its own CMAKE_<LANG>_ARCHIVE_CREATE/APPEND (deterministic "Dqc"),
+# so thin archives go through an ar that adds the T modifier instead
+THIN_AR = """#!/bin/sh
+op="$1"
+shift
+case "$op" in
+  -*) exec "{ar}" "$op" "$@" ;;
+  *) exec "{ar}" "${{op}}T" "$@" ;;
+esac
+"""
+PLAIN_AR = """#!/bin/sh
+exec "{ar}" "$@"
+"""
+
+
+def linker_works(cxx, linker):
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            res = subprocess.run(
+                [*cxx.split(), f"-fuse-ld={linker}", "-x", "c++", "-", "-o", str(Path(tmp) / "a.out")],
+                input="int main() { return 0; }\n",
+                capture_output=True,
+                text=True,
+            )
+        except OSError:
+            return False
+    return res.returncode == 0
+
+
+def detect_linker(cxx=None, prefer=LINKERS):
+    # first one the compiler can actually drive with -fuse-ld; gcc only knows
+    # -fuse-ld=mold from 12.1 on
+    cxx = cxx or os.environ.get("CXX") or "c++"
+    forced = os.environ.get("FAST_LINK_LINKER")
+    for linker in [forced] if forced else prefer:
+        if linker_works(cxx, linker):
+            return linker
+    return None
+
+
+def build_type(cmake_args):
+    found = re.findall(r"-DCMAKE_BUILD_TYPE(?::\w+)?=(\w+)", " ".join(cmake_args))
+    return found[-1] if found else ""
+
+
+def fast_link_args(build_dir, cmake_args=(), prefer=LINKERS):
+    # -D flags for a faster linking build and what got picked. Linux only:
+    # ld64 and link.exe stay, and neither libtool nor lib.exe do thin archives
+    info = {"linker": None, "thin_archives": False, "split_dwarf": False}
+    if platform.system() != "Linux":
+        return [], info
+    args = []
+    linker = detect_linker(prefer=prefer)
+    if linker:
+        args.append(f"-DLLVM_USE_LINKER={linker}")
+        info["linker"] = linker
+    ar = os.environ.get("AR") or shutil.which("ar")
+    if ar and "CMAKE_AR" not in " ".join(cmake_args):
+        wrapper = Path(build_dir) / "thin-ar"
+        wrapper.write_text(THIN_AR.format(ar=ar))
+        wrapper.chmod(0o755)
+        args.append(f"-DCMAKE_AR={wrapper}")
+        info["thin_archives"] = True
+    # no debug info in Release, nothing to split
+    if build_type(cmake_args) in {"Debug", "RelWithDebInfo"}:
+        args.append("-DLLVM_USE_SPLIT_DWARF=ON")
+        info["split_dwarf"] = True
+    return args, info
+
+
+def reset_args(build_dir):
+    # undo an earlier FAST_LINK configure of the same build tree. the wrapper's
+    # path is baked into CMakeFiles/<version>/CMake<LANG>Compiler.cmake, which
+    # neither -UCMAKE_AR nor -DCMAKE_AR touch, so it becomes a plain ar instead
+    wrapper = Path(build_dir) / "thin-ar"
+    if wrapper.exists():
+        ar = os.environ.get("AR") or shutil.which("ar") or "ar"
+        wrapper.write_text(PLAIN_AR.format(ar=ar))
+    return ["-ULLVM_USE_LINKER", "-ULLVM_USE_SPLIT_DWARF"]
+
+
+def fatten_archives(install_dir, build_dir):
+    # thin archives only reference the objects in the build tree, the
+    # installed copies have to be real ones
+    build_dir = Path(build_dir)
+    ar = os.environ.get("AR") or "ar"
+    originals = None
+    fattened = 0
+    for installed in Path(install_dir).rglob("*.a"):
+        with open(installed, "rb") as f:
+            if f.read(len(THIN_MAGIC)) != THIN_MAGIC:
+                continue
+        if originals is None:
+            originals = {}
+            for p in build_dir.rglob("*.a"):
+                originals.setdefault(p.name, p)
+        original = originals.get(installed.name)
+        if original is None:
+            raise RuntimeError(f"no build tree archive for thin {installed}")
+        members = subprocess.run(
+            [ar, "t", original.name], cwd=original.parent, capture_output=True, text=True, check=True
+        ).stdout.split()
+        tmp = installed.with_name(installed.name + ".tmp")
+        tmp.unlink(missing_ok=True)
+        subprocess.run([ar, "qcsD", str(tmp), *members], cwd=original.parent, check=True)
+        shutil.copymode(installed, tmp)
+        os.replace(tmp, installed)
+        fattened += 1
+    if fattened:
+        print(f"FASTLINK rebuilt {fattened} installed thin archives as normal archives", file=sys.stderr)
+    return fattened
+
+
+def ninja_runs(build_dir):
+    ninja_log = Path(build_dir) / ".ninja_log"
+    return build_profile.read_ninja_log(ninja_log) if ninja_log.exists() else []
+
+
+def link_report(build_dir, out_dir, since_run=0, info=None, baseline=None, top=20):
+    # link and archive steps of the ninja runs from since_run on
+    edges = []
+    for run in ninja_runs(build_dir)[since_run:]:
+        edges += build_profile.group_edges(run)
+    targets = []
+    for start, end, outs in edges:
+        kind = build_profile.classify(outs[0], build_profile.KIND_PATTERNS, "other")
+        if kind in {"link", "archive"}:
+            targets.append({"output": outs[0], "kind": kind, "seconds": (end - start) / 1000})
+    targets.sort(key=lambda t: -t["seconds"])
+    report = {
+        **(info or {}),
+        "link_seconds": sum(t["seconds"] for t in targets if t["kind"] == "link"),
+        "archive_seconds": sum(t["seconds"] for t in targets if t["kind"] == "archive"),
+        "targets": targets,
+    }
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / "link_times.json").write_text(json.dumps(report, indent=2))
+    print_report(report, baseline, top)
+    return report
+
+
+def print_report(report, baseline=None, top=20):
+    old = {t["output"]: t["seconds"] for t in (baseline or {}).get("targets", [])}
+
+    def delta(output, seconds):
+        return f" (was {old[output]:.1f}s)" if output in old else ""
+
+    for t in report["targets"][:top]:
+        print(f"FASTLINK {t['kind']} {t['output']}: {t['seconds']:.1f}s{delta(t['output'], t['seconds'])}", file=sys.stderr)
+    totals = f"links {report['link_seconds']:.1f}s, archives {report['archive_seconds']:.1f}s"
+    if baseline:
+        totals += f" (was {baseline['link_seconds']:.1f}s, {baseline['archive_seconds']:.1f}s)"
+    picked = ", ".join(f"{k}={report[k]}" for k in ["linker", "thin_archives", "split_dwarf"] if k in report)
+    print(f"FASTLINK {len(report['targets'])} targets: {totals}" + (f" [{picked}]" if picked else ""), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Link time per target from a ninja build dir")
+    parser.add_argument("build_dir")
+    parser.add_argument("--runs", type=int, default=1, help="how many of the last ninja runs to count")
+    parser.add_argument("--compare", default=None, help="earlier link_times.json to diff against")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--detect", action="store_true", help="only print the linker that would be used")
+    args = parser.parse_args()
+
+    if args.detect:
+        print(detect_linker())
+        sys.exit(0)
+    runs = len(ninja_runs(args.build_dir))
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    link_report(args.build_dir, args.build_dir, max(runs - args.runs, 0), baseline=baseline, top=args.top)
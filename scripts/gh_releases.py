@@ -1,50 +1,284 @@
+import argparse
+import datetime
+import json
 import os
+import random
+import re
+import sys
+import threading
 import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
-from github import Github
-import datetime
+# the releases the wheels get uploaded to
+DEFAULT_RELEASES = ["makslevental/wheels:113028511", "makslevental/mlir-wheels:111725799"]
+DEFAULT_PINS = ["llvmorg-15.0.7"]
+PER_PAGE = 100
+
+WHEEL_RE = re.compile(
+    r"^(?P<dist>[^-]+)-(?P<version>[^-]+)(-\d[^-]*)?-(?P<python>[^-]+)-(?P<abi>[^-]+)-(?P<platform>[^-]+)\.whl$"
+)
+
+
+class GitHubError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+class GitHub:
+    def __init__(self, api_url=None, token=None, max_retries=6):
+        self.api_url = (api_url or os.environ.get("GITHUB_API_URL") or "https://api.github.com").rstrip("/")
+        self.token = token if token is not None else os.environ.get("GITHUB_TOKEN")
+        self.max_retries = max_retries
+        self.requests = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+
+    def _backoff(self, attempt, headers):
+        # primary limit: wait for the reset; secondary limit: Retry-After;
+        # anything else exponential with jitter
+        if headers.get("Retry-After"):
+            return float(headers["Retry-After"])
+        if headers.get("X-RateLimit-Remaining") == "0" and headers.get("X-RateLimit-Reset"):
+            return max(float(headers["X-RateLimit-Reset"]) - time.time(), 0) + 1
+        return min(2**attempt, 60) * (0.5 + random.random())
+
+    def request(self, method, path, etag=None):
+        # (status, headers, parsed body); 304 comes back with body None
+        url = path if path.startswith("http") else self.api_url + path
+        headers = {"Accept": "application/vnd.github+json", "X-GitHub-Api-Version": "2022-11-28"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if etag:
+            headers["If-None-Match"] = etag
+        for attempt in range(self.max_retries + 1):
+            with self._lock:
+                self.requests += 1
+            req = urllib.request.Request(url, method=method, headers=headers)
+            try:
+                with urllib.request.urlopen(req, timeout=60) as res:
+                    body = res.read()
+                    return res.status, res.headers, json.loads(body) if body else None
+            except urllib.error.HTTPError as e:
+                if e.code == 304:
+                    with self._lock:
+                        self.not_modified += 1
+                    return 304, e.headers, None
+                retry = e.code in {429, 500, 502, 503, 504} or (
+                    e.code == 403
+                    and (e.headers.get("Retry-After") or e.headers.get("X-RateLimit-Remaining") == "0")
+                )
+                if not retry or attempt == self.max_retries:
+                    raise GitHubError(e.code, e.read().decode(errors="replace")[:500]) from None
+                delay = self._backoff(attempt, e.headers)
+            except (urllib.error.URLError, TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, {})
+            print(f"RELEASES {method} {url}: retrying in {delay:.1f}s", file=sys.stderr)
+            time.sleep(delay)
+
+
+def release_path(spec, gh):
+    # "owner/repo:<release id or tag>"
+    repo, release = spec.rsplit(":", 1)
+    if not release.isdigit():
+        _, _, body = gh.request("GET", f"/repos/{repo}/releases/tags/{release}")
+        release = body["id"]
+    return repo, int(release)
+
+
+class Index:
+    # assets per release, plus the ETag of every page of the asset listing so
+    # unchanged pages come back as 304s (which don't count against the quota)
+    def __init__(self, path):
+        self.path = Path(path) if path else None
+        self.data = {}
+        if self.path and self.path.exists():
+            self.data = json.loads(self.path.read_text())
+
+    def save(self):
+        if self.path:
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(json.dumps(self.data, indent=1))
+            os.replace(tmp, self.path)
+
+    def assets(self, key):
+        return self.data.get(key, {}).get("assets", {})
+
+    def refresh(self, gh, repo, release_id, max_age_minutes=0):
+        key = f"{repo}:{release_id}"
+        entry = self.data.setdefault(key, {"pages": [], "assets": {}, "refreshed_at": 0})
+        if max_age_minutes and time.time() - entry["refreshed_at"] < max_age_minutes * 60:
+            return key, 0
+        pages, assets, fetched = [], {}, 0
+        page = 1
+        while True:
+            cached = entry["pages"][page - 1] if page <= len(entry["pages"]) else None
+            status, headers, body = gh.request(
+                "GET",
+                f"/repos/{repo}/releases/{release_id}/assets?per_page={PER_PAGE}&page={page}",
+                cached["etag"] if cached else None,
+            )
+            if status == 304:
+                ids = cached["ids"]
+                items = {i: entry["assets"][i] for i in ids if i in entry["assets"]}
+            else:
+                fetched += 1
+                items = {
+                    str(a["id"]): {"name": a["name"], "created_at": a["created_at"], "size": a["size"]}
+                    for a in body
+                }
+                ids = list(items)
+            assets.update(items)
+            pages.append({"etag": headers.get("ETag") or (cached or {}).get("etag"), "ids": ids})
+            if len(ids) < PER_PAGE:
+                break
+            page += 1
+        entry.update(pages=pages, assets=assets, refreshed_at=time.time())
+        return key, fetched
+
+    def forget(self, key, asset_id):
+        entry = self.data[key]
+        entry["assets"].pop(asset_id, None)
+        # later pages shift, drop their ETags
+        for i, page in enumerate(entry["pages"]):
+            if asset_id in page["ids"]:
+                del entry["pages"][i:]
+                break
+
+
+def group_of(name):
+    # (distribution, variant, python, platform) for wheels, e.g. the perf cuda
+    # cp311 manylinux x86_64 mlir wheel; other assets with versions and
+    # hashes blanked out
+    m = WHEEL_RE.match(name)
+    if not m:
+        return ("other", re.sub(r"\d+(\.\d+)+|\b[0-9a-f]{7,40}\b", "*", name), "", "")
+    local = m.group("version").partition("+")[2].split(".")
+    # the last local segment is the llvm commit
+    variant = ".".join(local[:-1])
+    return (m.group("dist").lower().replace("_", "-"), variant, m.group("python"), m.group("platform"))
+
+
+def parse_time(s):
+    return datetime.datetime.fromisoformat(s.replace("Z", "+00:00"))
+
+
+def plan(assets, now, max_age_days=30, keep_last=0, pins=()):
+    # -> {asset id: (action, reason)}; an asset is deleted only when it's
+    # older than max_age_days, not pinned and not one of the keep_last newest
+    # of its group
+    pin_res = [re.compile(p) for p in pins]
+    groups = defaultdict(list)
+    for asset_id, a in assets.items():
+        groups[group_of(a["name"])].append(asset_id)
+    decisions = {}
+    cutoff = now - datetime.timedelta(days=max_age_days)
+    for ids in groups.values():
+        ids.sort(key=lambda i: (assets[i]["created_at"], assets[i]["name"]), reverse=True)
+        for rank, asset_id in enumerate(ids):
+            a = assets[asset_id]
+            if any(p.search(a["name"]) for p in pin_res):
+                decisions[asset_id] = ("keep", "pinned")
+            elif rank < keep_last:
+                decisions[asset_id] = ("keep", f"newest {keep_last} of its group")
+            elif parse_time(a["created_at"]) >= cutoff:
+                decisions[asset_id] = ("keep", f"younger than {max_age_days} days")
+            else:
+                decisions[asset_id] = ("delete", f"older than {max_age_days} days")
+    return decisions
+
+
+def delete_assets(gh, index, key, ids, jobs):
+    repo = key.rsplit(":", 1)[0]
+
+    def delete(asset_id):
+        try:
+            gh.request("DELETE", f"/repos/{repo}/releases/assets/{asset_id}")
+        except GitHubError as e:
+            # someone else got there first
+            if e.status != 404:
+                return asset_id, str(e)
+        return asset_id, None
+
+    failed = {}
+    with ThreadPoolExecutor(jobs) as pool:
+        for asset_id, error in pool.map(delete, ids):
+            if error:
+                failed[asset_id] = error
+            else:
+                index.forget(key, asset_id)
+    return failed
+
+
+def report(key, assets, decisions):
+    by_group = defaultdict(lambda: {"keep": 0, "delete": 0, "delete_bytes": 0})
+    for asset_id, (action, _) in decisions.items():
+        g = by_group["/".join(filter(None, group_of(assets[asset_id]["name"])))]
+        g[action] += 1
+        if action == "delete":
+            g["delete_bytes"] += assets[asset_id]["size"]
+    return {
+        "release": key,
+        "keep": sum(g["keep"] for g in by_group.values()),
+        "delete": sum(g["delete"] for g in by_group.values()),
+        "delete_bytes": sum(g["delete_bytes"] for g in by_group.values()),
+        "groups": dict(sorted(by_group.items())),
+        "deleted": sorted(assets[i]["name"] for i, (action, _) in decisions.items() if action == "delete"),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prune old assets from the wheel releases")
+    parser.add_argument("--release", action="append", help=f"owner/repo:<release id or tag>, default {DEFAULT_RELEASES}")
+    parser.add_argument("--max-age-days", type=float, default=30)
+    parser.add_argument("--keep-last", type=int, default=0, help="always keep the newest N of each variant/platform")
+    parser.add_argument("--pin", action="append", help=f"regex of asset names never deleted, default {DEFAULT_PINS}")
+    parser.add_argument("--index", default="gh_releases_index.json", help="local asset index ('' to disable)")
+    parser.add_argument("--refresh-after", type=float, default=0, help="reuse an index younger than this many minutes")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="concurrent deletes")
+    parser.add_argument("--api-url", default=None, help="default $GITHUB_API_URL or api.github.com")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--report", default=None, help="write the JSON report here")
+    args = parser.parse_args()
+
+    gh = GitHub(args.api_url)
+    index = Index(args.index)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    reports, failed = [], {}
+    try:
+        for spec in args.release or DEFAULT_RELEASES:
+            repo, release_id = release_path(spec, gh)
+            start = time.perf_counter()
+            key, fetched = index.refresh(gh, repo, release_id, args.refresh_after)
+            assets = dict(index.assets(key))
+            print(
+                f"RELEASES {key}: {len(assets)} assets, {fetched} pages fetched in {time.perf_counter() - start:.1f}s",
+                file=sys.stderr,
+            )
+            decisions = plan(assets, now, args.max_age_days, args.keep_last, args.pin or DEFAULT_PINS)
+            r = report(key, assets, decisions)
+            reports.append(r)
+            for name in r["deleted"][:20]:
+                print(f"RELEASES {'would delete' if args.dry_run else 'deleting'} {name}")
+            print(f"RELEASES {key}: keep {r['keep']}, delete {r['delete']} ({r['delete_bytes'] / 2**30:.1f}GiB)")
+            if not args.dry_run:
+                ids = [i for i, (action, _) in decisions.items() if action == "delete"]
+                errors = delete_assets(gh, index, key, ids, args.jobs)
+                failed.update({assets[i]["name"]: e for i, e in errors.items()})
+                r["failed"] = sorted(assets[i]["name"] for i in errors)
+    finally:
+        index.save()
 
-# Authentication is defined via github.Auth
-from github import Auth
-
-# using an access token
-auth = Auth.Token(os.environ["GITHUB_TOKEN"])
-
-onemonthago = datetime.date.today() - datetime.timedelta(days=30)
-
-# First create a Github instance:
-
-# Public Web Github
-g = Github(auth=auth)
-
-n_deleted = 0
-for _ in range(100):
-    n_deleted = 0
-    repo = g.get_repo("makslevental/wheels")
-    release = repo.get_release(113028511)
-    assets = release.get_assets()
-    for ass in assets:
-        if "llvmorg-15.0.7" in ass.name:
-            continue
-        if ass.created_at.date() < onemonthago:
-            print(ass.name)
-            assert ass.delete_asset()
-            n_deleted += 1
-
-    repo = g.get_repo("makslevental/mlir-wheels")
-    release = repo.get_release(111725799)
-    assets = release.get_assets()
-    for ass in assets:
-        if "llvmorg-15.0.7" in ass.name:
-            continue
-        if ass.created_at.date() < onemonthago:
-            print(ass.name)
-            assert ass.delete_asset()
-            n_deleted += 1
-
-    if n_deleted == 0:
-        break
-    time.sleep(5)
-
-if n_deleted > 0:
-    raise Exception("missed some")
+    print(f"RELEASES {gh.requests} requests, {gh.not_modified} not modified", file=sys.stderr)
+    if args.report:
+        Path(args.report).write_text(json.dumps(reports, indent=2))
+    for name, error in sorted(failed.items())[:20]:
+        print(f"RELEASES failed to delete {name}: {error}", file=sys.stderr)
+    if failed:
+        raise Exception(f"missed {len(failed)} assets")
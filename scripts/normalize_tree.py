@@ -0,0 +1,98 @@
+import argparse
+import os
+import shutil
+import stat
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# same instant as `touch -t 197001010000`, i.e. local time
+EPOCH = time.mktime((1970, 1, 1, 0, 0, 0, 0, 1, -1))
+
+# build-only leftovers that shouldn't end up in the wheel
+DROP = {"python_packages", "__pycache__"}
+
+
+def _walk(root, drop):
+    # sorted so the pass (and anything that consumes its output) is deterministic
+    dirs, files, dropped = [], [], []
+    stack = [Path(root)]
+    while stack:
+        d = stack.pop()
+        dirs.append(d)
+        with os.scandir(d) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        for e in reversed(entries):
+            if e.name in drop and e.is_dir(follow_symlinks=False):
+                dropped.append(Path(e.path))
+            elif e.is_dir(follow_symlinks=False):
+                stack.append(Path(e.path))
+            else:
+                files.append((Path(e.path), e.is_symlink()))
+    return dirs, files, dropped
+
+
+def _fix(path, is_link, is_dir, chmod):
+    if chmod and not is_link:
+        mode = path.stat().st_mode
+        if is_dir or mode & (stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH):
+            os.chmod(path, 0o755)
+        else:
+            os.chmod(path, 0o644)
+    if is_link and os.utime not in os.supports_follow_symlinks:
+        return
+    os.utime(path, (EPOCH, EPOCH), follow_symlinks=False)
+
+
+def _fix_chunk(chunk, chmod):
+    for path, is_link, is_dir in chunk:
+        try:
+            _fix(path, is_link, is_dir, chmod)
+        except FileNotFoundError:
+            pass
+
+
+def normalize(root, chmod=True, drop=DROP, jobs=None):
+    start = time.perf_counter()
+    dirs, files, dropped = _walk(root, drop)
+    for d in dropped:
+        shutil.rmtree(d, ignore_errors=True)
+
+    # os.utime/os.chmod release the GIL, threads are enough
+    entries = [(p, link, False) for p, link in files]
+    jobs = jobs or min(32, (os.cpu_count() or 1) * 2)
+    chunk = max(1, -(-len(entries) // (jobs * 4)))
+    with ThreadPoolExecutor(jobs) as pool:
+        list(
+            pool.map(
+                lambda i: _fix_chunk(entries[i : i + chunk], chmod),
+                range(0, len(entries), chunk),
+            )
+        )
+    # directories last and deepest first, fixing their children bumps their mtime
+    _fix_chunk([(d, False, True) for d in reversed(dirs)], chmod)
+
+    print(
+        f"normalized {len(files)} files and {len(dirs)} dirs in {root} "
+        f"(dropped {[str(d.relative_to(root)) for d in dropped]}) "
+        f"in {time.perf_counter() - start:.1f}s",
+        file=sys.stderr,
+    )
+    return len(files)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reset timestamps/permissions of a tree and drop build leftovers"
+    )
+    parser.add_argument("root")
+    parser.add_argument("--timestamps-only", action="store_true", help="don't chmod or drop anything")
+    parser.add_argument("-j", "--jobs", type=int, default=None)
+    args = parser.parse_args()
+    normalize(
+        args.root,
+        chmod=not args.timestamps_only,
+        drop=set() if args.timestamps_only else DROP,
+        jobs=args.jobs,
+    )
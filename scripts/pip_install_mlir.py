@@ -0,0 +1,244 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import site
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# installs the mlir and mlir-native-tools wheels the bindings build against.
+# pinned versions (MLIR_WHEEL_VERSION) are kept in a content-addressed store
+# so the next interpreter/build installs them without touching the network
+
+FIND_LINKS = "wheelhouse https://github.com/makslevental/mlir-wheels/releases/expanded_assets/latest"
+# same order as the local version tags in setup.py
+LOCAL_VERSION_FLAGS = ["BUILD_CUDA", "BUILD_AMDGPU", "BUILD_VULKAN", "BUILD_OPENMP", "DISTRIBUTION_PROFILE", "BUILD_PERF"]
+WHEEL_RE = re.compile(r"^(?P<dist>[^-]+)-(?P<version>[^-]+)(-\d[^-]*)?-(?P<python>[^-]+)-(?P<abi>[^-]+)-(?P<platform>[^-]+)\.whl$")
+
+
+def check_env(build, env=os.environ):
+    return env.get(build, 0) in {"1", "true", "True", "ON", "YES"}
+
+
+def resolve_versions(env=os.environ):
+    # MLIR_WHEEL_VERSION is <version>+<commit> (what the native tools wheel is
+    # versioned as); the mlir wheel of this variant has its tags before the commit
+    wheel_version = env.get("MLIR_WHEEL_VERSION")
+    if not wheel_version:
+        return {"mlir-native-tools": None, "mlir": None}
+    version, commit = wheel_version.split("+", 1)
+    tags = []
+    for flag in LOCAL_VERSION_FLAGS:
+        if flag == "DISTRIBUTION_PROFILE":
+            if env.get(flag):
+                tags.append(env[flag].replace("-", ""))
+        elif check_env(flag, env):
+            tags.append(flag[len("BUILD_") :].lower())
+    return {"mlir-native-tools": wheel_version, "mlir": f"{version}+{'.'.join(tags + [commit])}"}
+
+
+def cross_platform(env=os.environ):
+    # the arm64/aarch64 builds install the target's mlir next to the host's python
+    if env.get("CIBW_ARCHS") not in {"arm64", "aarch64"}:
+        return None
+    if env.get("MATRIX_OS") in {"macos-13", "macos-14"}:
+        return "macosx_12_0_arm64"
+    if env.get("MATRIX_OS") in {"ubuntu-20.04", "ubuntu-22.04-arm"}:
+        return "linux_aarch64"
+    return None
+
+
+def pip_env(env=os.environ):
+    env = dict(env)
+    env["PIP_FIND_LINKS"] = FIND_LINKS
+    # a simple index from scripts/simple_index.py resolves from the .metadata
+    # files instead of scraping (and downloading) everything on expanded_assets
+    if env.get("MLIR_INDEX_URL"):
+        env["PIP_FIND_LINKS"] = "wheelhouse"
+        env["PIP_EXTRA_INDEX_URL"] = env["MLIR_INDEX_URL"]
+    return env
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def normalize(name):
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+class WheelStore:
+    # blobs/<sha256> plus index.json: {"<project> <version> <platform> <python>": {filename, sha256, size}}.
+    # a blob's mtime is its last use, for LRU eviction
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = Path(
+            directory or os.environ.get("MLIR_WHEEL_STORE") or Path.home() / ".cache" / "mlir-wheels"
+        )
+        self.max_bytes = int(max_bytes or os.environ.get("MLIR_WHEEL_STORE_SIZE") or 4 << 30)
+        self.blobs = self.directory / "blobs"
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.directory / "index.json"
+        self._lock = threading.Lock()
+
+    def _index(self):
+        return json.loads(self.index_path.read_text()) if self.index_path.exists() else {}
+
+    def _write_index(self, index):
+        tmp = self.index_path.with_name(f"index.json.{os.getpid()}")
+        tmp.write_text(json.dumps(index, indent=1))
+        os.replace(tmp, self.index_path)
+
+    @staticmethod
+    def keys(project, version, platform):
+        # py3-none wheels serve every interpreter, others only their own
+        py = f"cp{sys.version_info[0]}{sys.version_info[1]}"
+        return [f"{project} {version} {platform or 'native'} {p}" for p in ["py3", py]]
+
+    def get(self, project, version, platform):
+        # -> (path, filename) of a verified blob, or None
+        index = self._index()
+        for key in self.keys(project, version, platform):
+            entry = index.get(key)
+            if entry is None:
+                continue
+            blob = self.blobs / entry["sha256"]
+            if blob.exists() and sha256_file(blob) == entry["sha256"]:
+                os.utime(blob)
+                return blob, entry["filename"]
+            # corrupt or evicted
+            blob.unlink(missing_ok=True)
+            with self._lock:
+                index = self._index()
+                index.pop(key, None)
+                self._write_index(index)
+        return None
+
+    def put(self, project, version, platform, wheel):
+        wheel = Path(wheel)
+        digest = sha256_file(wheel)
+        blob = self.blobs / digest
+        if not blob.exists():
+            tmp = self.blobs / f".{digest}.{os.getpid()}.{threading.get_ident()}"
+            shutil.copyfile(wheel, tmp)
+            os.replace(tmp, blob)
+        os.utime(blob)
+        python = WHEEL_RE.match(wheel.name).group("python")
+        key = self.keys(project, version, platform)[0 if python.startswith("py") else 1]
+        with self._lock:
+            index = self._index()
+            index[key] = {"filename": wheel.name, "sha256": digest, "size": blob.stat().st_size}
+            self._write_index(index)
+        return blob
+
+    def evict(self):
+        blobs = sorted((p.stat().st_mtime, p.stat().st_size, p) for p in self.blobs.iterdir() if not p.name.startswith("."))
+        total = sum(size for _, size, _ in blobs)
+        evicted = set()
+        for _, size, p in blobs:
+            if total <= self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            evicted.add(p.name)
+            total -= size
+        if evicted:
+            with self._lock:
+                index = {k: v for k, v in self._index().items() if v["sha256"] not in evicted}
+                self._write_index(index)
+        return len(evicted), total
+
+
+def download(project, version, platform, dest, env):
+    cmd = [sys.executable, "-m", "pip", "download", "--no-deps", "-d", str(dest), project + (f"=={version}" if version else "")]
+    if platform:
+        cmd += ["--platform", platform, "--only-binary=:all:"]
+    subprocess.run(cmd, check=True, env=env)
+    wheels = [p for p in Path(dest).glob("*.whl") if normalize(WHEEL_RE.match(p.name).group("dist")) == project]
+    if len(wheels) != 1:
+        raise RuntimeError(f"expected one {project} wheel in {dest}, got {[p.name for p in wheels]}")
+    return wheels[0]
+
+
+def fetch(store, wanted, platforms, env):
+    # -> {project: wheel path}; hits come from the store, misses are
+    # downloaded in parallel and stored. unpinned versions always go to the index
+    tmp = Path(tempfile.mkdtemp(prefix="pip_install_mlir"))
+    found, misses = {}, []
+    for project, version in wanted.items():
+        hit = store.get(project, version, platforms[project]) if version else None
+        if hit:
+            blob, filename = hit
+            # pip wants the real wheel name
+            link = tmp / filename
+            try:
+                os.link(blob, link)
+            except OSError:
+                shutil.copyfile(blob, link)
+            found[project] = link
+            print(f"WHEELS {filename}: from the store", file=sys.stderr)
+        else:
+            misses.append(project)
+
+    def get(project):
+        dest = tmp / project
+        wheel = download(project, wanted[project], platforms[project], dest, env)
+        version = wanted[project] or WHEEL_RE.match(wheel.name).group("version")
+        store.put(project, version, platforms[project], wheel)
+        print(f"WHEELS {wheel.name}: downloaded and stored", file=sys.stderr)
+        return project, wheel
+
+    try:
+        with ThreadPoolExecutor(max(len(misses), 1)) as pool:
+            found.update(pool.map(get, misses))
+    finally:
+        if misses:
+            store.evict()
+    return found, tmp
+
+
+def install(wheels, platform, env):
+    pip = [sys.executable, "-m", "pip", "install", "--no-index", "--no-deps", "--force-reinstall"]
+    subprocess.run([*pip, str(wheels["mlir-native-tools"])], check=True, env=env)
+    if platform:
+        target = site.getsitepackages()[0]
+        subprocess.run(
+            [*pip, str(wheels["mlir"]), "--platform", platform, "--only-binary=:all:", "--target", target, "-U"],
+            check=True,
+            env=env,
+        )
+    else:
+        subprocess.run([*pip, str(wheels["mlir"])], check=True, env=env)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Install the mlir and mlir-native-tools wheels for the bindings build")
+    parser.add_argument("--store", default=None, help="default $MLIR_WHEEL_STORE or ~/.cache/mlir-wheels")
+    parser.add_argument("--max-bytes", type=int, default=None, help="default $MLIR_WHEEL_STORE_SIZE or 4GiB")
+    parser.add_argument("--print-versions", action="store_true", help="only print what would be installed")
+    args = parser.parse_args()
+
+    wanted = resolve_versions()
+    platform = cross_platform()
+    # the native tools run on the build machine
+    platforms = {"mlir-native-tools": None, "mlir": platform}
+    if args.print_versions:
+        for project, version in wanted.items():
+            print(f"{project}{'==' + version if version else ''}{' --platform ' + platforms[project] if platforms[project] else ''}")
+        sys.exit(0)
+
+    env = pip_env()
+    store = WheelStore(args.store, args.max_bytes)
+    wheels, tmp = fetch(store, wanted, platforms, env)
+    try:
+        install(wheels, platform, env)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
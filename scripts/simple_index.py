@@ -0,0 +1,256 @@
+import argparse
+import datetime
+import hashlib
+import html
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import zipfile
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# static PEP 503 (html) / PEP 691 (json) simple index over a wheelhouse, with
+# PEP 658 .metadata files so pip can resolve without downloading wheels:
+#
+#   OUT/simple/index.{html,json}              projects
+#   OUT/simple/<project>/index.{html,json}    files of one project
+#   OUT/files/<wheel>.metadata                next to the wheel (or uploaded next to it)
+#   OUT/state.json                            what's indexed, for incremental updates
+
+API_VERSION = "1.1"
+JSON_TYPE = "application/vnd.pypi.simple.v1+json"
+WHEEL_RE = re.compile(r"^(?P<dist>[^-]+)-(?P<version>[^-]+)(-\d[^-]*)?-[^-]+-[^-]+-[^-]+\.whl$")
+
+
+def normalize(name):
+    # PEP 503
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def wheel_metadata(path):
+    with zipfile.ZipFile(path) as z:
+        names = [n for n in z.namelist() if re.match(r"^[^/]+\.dist-info/METADATA$", n)]
+        if len(names) != 1:
+            raise ValueError(f"{path}: expected one .dist-info/METADATA, found {names}")
+        return z.read(names[0])
+
+
+def requires_python(metadata):
+    m = re.search(rb"^Requires-Python: *(.+?)\r?$", metadata, re.M)
+    return m.group(1).decode() if m else None
+
+
+def scan(wheelhouse, state, metadata_dir):
+    # index new or changed wheels; unchanged ones (same size and mtime) are
+    # neither hashed nor opened again
+    added = []
+    for wheel in sorted(Path(wheelhouse).glob("*.whl")):
+        m = WHEEL_RE.match(wheel.name)
+        if not m:
+            print(f"INDEX skipping {wheel.name}, not a wheel name", file=sys.stderr)
+            continue
+        st = wheel.stat()
+        old = state["files"].get(wheel.name)
+        if old and old["size"] == st.st_size and old["mtime"] == st.st_mtime_ns:
+            continue
+        metadata = wheel_metadata(wheel)
+        (Path(metadata_dir) / (wheel.name + ".metadata")).write_bytes(metadata)
+        state["files"][wheel.name] = {
+            "project": normalize(m.group("dist")),
+            "version": m.group("version"),
+            "sha256": sha256_file(wheel),
+            "size": st.st_size,
+            "mtime": st.st_mtime_ns,
+            "metadata_sha256": hashlib.sha256(metadata).hexdigest(),
+            "requires_python": requires_python(metadata),
+            "upload_time": datetime.datetime.fromtimestamp(st.st_mtime, datetime.timezone.utc).strftime(
+                "%Y-%m-%dT%H:%M:%S.%fZ"
+            ),
+        }
+        added.append(wheel.name)
+    return added
+
+
+def project_json(project, files, base_url):
+    return {
+        "meta": {"api-version": API_VERSION},
+        "name": project,
+        "versions": sorted({f["version"] for f in files.values()}),
+        "files": [
+            {
+                "filename": name,
+                "url": base_url + name,
+                "hashes": {"sha256": f["sha256"]},
+                "requires-python": f["requires_python"],
+                "core-metadata": {"sha256": f["metadata_sha256"]},
+                # the pre-PEP 714 spelling, older pips only know this one
+                "dist-info-metadata": {"sha256": f["metadata_sha256"]},
+                "size": f["size"],
+                "upload-time": f["upload_time"],
+            }
+            for name, f in sorted(files.items())
+        ],
+    }
+
+
+def project_html(page):
+    links = []
+    for f in page["files"]:
+        attrs = [f'href="{html.escape(f["url"])}#sha256={f["hashes"]["sha256"]}"']
+        if f["requires-python"]:
+            attrs.append(f'data-requires-python="{html.escape(f["requires-python"])}"')
+        attrs.append(f'data-core-metadata="sha256={f["core-metadata"]["sha256"]}"')
+        attrs.append(f'data-dist-info-metadata="sha256={f["core-metadata"]["sha256"]}"')
+        links.append(f"    <a {' '.join(attrs)}>{html.escape(f['filename'])}</a><br/>")
+    return (
+        f'<!DOCTYPE html>\n<html>\n  <head>\n    <meta name="pypi:repository-version" content="{API_VERSION}">\n'
+        f"    <title>Links for {page['name']}</title>\n  </head>\n  <body>\n    <h1>Links for {page['name']}</h1>\n"
+        + "\n".join(links)
+        + "\n  </body>\n</html>\n"
+    )
+
+
+def root_pages(projects):
+    data = {"meta": {"api-version": API_VERSION}, "projects": [{"name": p} for p in projects]}
+    links = "\n".join(f'    <a href="{p}/">{p}</a><br/>' for p in projects)
+    page = (
+        f'<!DOCTYPE html>\n<html>\n  <head>\n    <meta name="pypi:repository-version" content="{API_VERSION}">\n'
+        f"    <title>Simple index</title>\n  </head>\n  <body>\n{links}\n  </body>\n</html>\n"
+    )
+    return data, page
+
+
+def write_if_changed(path, text):
+    path = Path(path)
+    if path.exists() and path.read_text() == text:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+    return True
+
+
+def build(wheelhouse, out, base_url=None, metadata_dir=None, prune_missing=False):
+    out = Path(out)
+    files_dir = out / "files"
+    files_dir.mkdir(parents=True, exist_ok=True)
+    metadata_dir = Path(metadata_dir or files_dir)
+    metadata_dir.mkdir(parents=True, exist_ok=True)
+    state_path = out / "state.json"
+    state = json.loads(state_path.read_text()) if state_path.exists() else {"files": {}}
+
+    added = scan(wheelhouse, state, metadata_dir)
+    removed, removed_projects = [], set()
+    if prune_missing:
+        present = {p.name for p in Path(wheelhouse).glob("*.whl")}
+        removed = [name for name in state["files"] if name not in present]
+        for name in removed:
+            removed_projects.add(state["files"].pop(name)["project"])
+            for p in [files_dir / name, metadata_dir / (name + ".metadata")]:
+                p.unlink(missing_ok=True)
+    if base_url is None:
+        # serve the wheels from OUT/files too, relative to simple/<project>/
+        base_url = "../../files/"
+        for name in added:
+            dest = files_dir / name
+            dest.unlink(missing_ok=True)
+            try:
+                os.link(Path(wheelhouse) / name, dest)
+            except OSError:
+                shutil.copy2(Path(wheelhouse) / name, dest)
+    elif not base_url.endswith("/"):
+        base_url += "/"
+
+    by_project = {}
+    for name, f in state["files"].items():
+        by_project.setdefault(f["project"], {})[name] = f
+    changed = {state["files"][n]["project"] for n in added} | removed_projects
+    # a different base url changes every page
+    if state.get("base_url") != base_url:
+        changed = set(by_project)
+    written = 0
+    for project in sorted(changed & set(by_project)):
+        page = project_json(project, by_project[project], base_url)
+        written += write_if_changed(out / "simple" / project / "index.json", json.dumps(page, indent=1))
+        written += write_if_changed(out / "simple" / project / "index.html", project_html(page))
+    for project in changed - set(by_project):
+        shutil.rmtree(out / "simple" / project, ignore_errors=True)
+    data, page = root_pages(sorted(by_project))
+    written += write_if_changed(out / "simple" / "index.json", json.dumps(data, indent=1))
+    written += write_if_changed(out / "simple" / "index.html", page)
+
+    state["base_url"] = base_url
+    write_if_changed(state_path, json.dumps(state, indent=1))
+    print(
+        f"INDEX {len(state['files'])} wheels in {len(by_project)} projects: {len(added)} added, "
+        f"{len(removed)} removed, {written} pages written",
+        file=sys.stderr,
+    )
+    return added, removed
+
+
+class IndexHandler(SimpleHTTPRequestHandler):
+    # PEP 691 content negotiation over the static tree: index.json for json
+    # clients, index.html for everyone else
+    def send_head(self):
+        path = Path(self.translate_path(self.path))
+        if path.is_dir() and self.path.endswith("/") and JSON_TYPE in self.headers.get("Accept", ""):
+            page = path / "index.json"
+            if page.exists():
+                body = page.read_bytes()
+                self.send_response(200)
+                self.send_header("Content-Type", JSON_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Vary", "Accept")
+                self.end_headers()
+                return io.BytesIO(body)
+        return super().send_head()
+
+
+class QuietIndexHandler(IndexHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve(out, port=0, quiet=True):
+    handler = partial(QuietIndexHandler if quiet else IndexHandler, directory=str(out))
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Static PEP 503/691 simple index with PEP 658 metadata over a wheelhouse")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="add the wheels of a wheelhouse to the index")
+    b.add_argument("wheelhouse")
+    b.add_argument("-o", "--output", default="index")
+    b.add_argument(
+        "--base-url",
+        default=None,
+        help="where the wheels are downloaded from, e.g. a release download url (default: hard links in OUT/files)",
+    )
+    b.add_argument("--metadata-dir", default=None, help="write the .metadata files here, to upload next to the wheels")
+    b.add_argument("--prune-missing", action="store_true", help="drop wheels that are no longer in the wheelhouse")
+    s = sub.add_parser("serve", help="serve an index locally, e.g. pip install --index-url http://127.0.0.1:PORT/simple")
+    s.add_argument("output", nargs="?", default="index")
+    s.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build(args.wheelhouse, args.output, args.base_url, args.metadata_dir, args.prune_missing)
+    else:
+        server = serve(args.output, args.port, quiet=False)
+        print(f"serving {args.output} on http://127.0.0.1:{server.server_port}/simple/", file=sys.stderr)
+        server.serve_forever()
@@ -0,0 +1,163 @@
+import argparse
+import base64
+import csv
+import hashlib
+import io
+import json
+import re
+import sys
+import zipfile
+from pathlib import Path
+
+HERE = Path(__file__).parent.resolve()
+MANIFEST = HERE / "wheel_components.json"
+
+
+def load_manifest(path=MANIFEST):
+    manifest = json.loads(Path(path).read_text())
+    for c in manifest["components"]:
+        c["regexes"] = [re.compile(p) for p in c["patterns"]]
+    return manifest
+
+
+def assign(name, components):
+    # first matching component wins, so more specific ones come first
+    for c in components:
+        if any(r.search(name) for r in c["regexes"]):
+            return c["name"]
+    return None
+
+
+def _dist(name):
+    return re.sub(r"[-_.]+", "_", name)
+
+
+def _record_hash(data):
+    digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b"=").decode()
+    return f"sha256={digest}"
+
+
+def read_wheel_info(zf):
+    dist_info = next(n.split("/")[0] for n in zf.namelist() if n.split("/")[0].endswith(".dist-info"))
+    metadata = zf.read(f"{dist_info}/METADATA").decode()
+    wheel = zf.read(f"{dist_info}/WHEEL").decode()
+    version = re.search(r"^Version: (.*)$", metadata, re.M).group(1).strip()
+    record = {}
+    for row in csv.reader(io.TextIOWrapper(zf.open(f"{dist_info}/RECORD"), encoding="utf-8")):
+        if len(row) == 3 and row[1]:
+            record[row[0]] = (row[1], row[2])
+    return dist_info, metadata, wheel, version, record
+
+
+def _metadata(name, version, summary, requires, source_metadata):
+    lines = ["Metadata-Version: 2.1", f"Name: {name}", f"Version: {version}", f"Summary: {summary}"]
+    # keep author/url/etc. of the monolithic wheel
+    for key in ["Home-page", "Download-URL", "Author", "Author-email", "License"]:
+        m = re.search(rf"^{key}: (.*)$", source_metadata, re.M)
+        if m:
+            lines.append(f"{key}: {m.group(1)}")
+    lines += [f"Requires-Dist: {r}=={version}" for r in requires]
+    return "\n".join(lines) + "\n"
+
+
+def _wheel_file(source_wheel):
+    lines = ["Wheel-Version: 1.0", "Generator: split_wheel.py", "Root-Is-Purelib: false"]
+    lines += [l for l in source_wheel.splitlines() if l.startswith("Tag: ")]
+    return "\n".join(lines) + "\n"
+
+
+def write_wheel(path, dist_info, members, src, record, metadata, wheel):
+    rows = []
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as out:
+        for info in members:
+            out.writestr(info, src.read(info.filename), compress_type=zipfile.ZIP_DEFLATED)
+            digest, size = record.get(info.filename) or (None, None)
+            if digest is None:
+                data = src.read(info.filename)
+                digest, size = _record_hash(data), len(data)
+            rows.append((info.filename, digest, size))
+        for name, text in [("METADATA", metadata), ("WHEEL", wheel)]:
+            data = text.encode()
+            out.writestr(f"{dist_info}/{name}", data)
+            rows.append((f"{dist_info}/{name}", _record_hash(data), len(data)))
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator="\n").writerows(rows + [(f"{dist_info}/RECORD", "", "")])
+        out.writestr(f"{dist_info}/RECORD", buf.getvalue())
+
+
+def split(wheel_path, out_dir, manifest_path=MANIFEST):
+    manifest = load_manifest(manifest_path)
+    components = manifest["components"]
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    wheel_path = Path(wheel_path)
+    # the meta wheel has the same name as the monolithic one
+    if out_dir.resolve() == wheel_path.parent.resolve():
+        raise ValueError(f"output dir has to differ from {wheel_path.parent}")
+    # {name}-{version}(-{build})?-{python}-{abi}-{platform}.whl
+    tags = wheel_path.stem.split("-", 2)[2]
+
+    with zipfile.ZipFile(wheel_path) as src:
+        dist_info, metadata, wheel, version, record = read_wheel_info(src)
+        members = {c["name"]: [] for c in components}
+        unassigned = []
+        for info in src.infolist():
+            if info.is_dir() or info.filename.startswith(dist_info + "/"):
+                continue
+            c = assign(info.filename, components)
+            (members[c] if c else unassigned).append(info)
+        if unassigned:
+            raise ValueError(
+                f"no component for {[i.filename for i in unassigned[:10]]}; fix {manifest_path}"
+            )
+
+        written = []
+        for c in components:
+            name = c["name"]
+            out = out_dir / f"{_dist(name)}-{version}-{tags}.whl"
+            write_wheel(
+                out,
+                f"{_dist(name)}-{version}.dist-info",
+                members[name],
+                src,
+                record,
+                _metadata(name, version, c["summary"], c["requires"], metadata),
+                _wheel_file(wheel),
+            )
+            size = sum(i.file_size for i in members[name])
+            print(
+                f"SPLIT {out.name}: {len(members[name])} files, {size / 2**20:.1f}MB uncompressed, "
+                f"{out.stat().st_size / 2**20:.1f}MB",
+                file=sys.stderr,
+            )
+            written.append(out)
+
+        meta = manifest["meta"]
+        out = out_dir / f"{_dist(meta)}-{version}-{tags}.whl"
+        summary = re.search(r"^Summary: (.*)$", metadata, re.M)
+        write_wheel(
+            out,
+            f"{_dist(meta)}-{version}.dist-info",
+            [],
+            src,
+            record,
+            _metadata(
+                meta,
+                version,
+                summary.group(1) if summary else meta,
+                [c["name"] for c in components],
+                metadata,
+            ),
+            _wheel_file(wheel),
+        )
+        written.append(out)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split the mlir wheel into component wheels")
+    parser.add_argument("wheel")
+    parser.add_argument("-o", "--output-dir", required=True)
+    parser.add_argument("--manifest", default=MANIFEST)
+    args = parser.parse_args()
+    split(args.wheel, args.output_dir, args.manifest)
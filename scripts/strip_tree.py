@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ELF_MAGIC = b"\x7fELF"
+MACHO_MAGICS = {b"\xcf\xfa\xed\xfe", b"\xce\xfa\xed\xfe", b"\xca\xfe\xba\xbe", b"\xfe\xed\xfa\xcf"}
+AR_MAGIC = b"!<arch>\n"
+
+# first match wins; paths are relative to the install prefix
+COMPONENT_PATTERNS = [
+    ("headers", re.compile(r"^include/")),
+    ("cmake", re.compile(r"^lib/cmake/")),
+    ("mlir", re.compile(r"mlir|MLIR")),
+    ("clang", re.compile(r"clang|Clang")),
+    ("lld", re.compile(r"lld|wasm-ld")),
+]
+
+UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def file_kind(path):
+    try:
+        with open(path, "rb") as f:
+            head = f.read(8)
+    except OSError:
+        return None
+    if head[:4] == ELF_MAGIC:
+        return "elf"
+    if head[:4] in MACHO_MAGICS:
+        return "macho"
+    if head == AR_MAGIC:
+        return "archive"
+    return None
+
+
+def component(rel):
+    for name, pattern in COMPONENT_PATTERNS:
+        if pattern.search(rel):
+            return name
+    return "llvm"
+
+
+def parse_budget(spec):
+    # "total=2.5G,mlir=900M,clang=600M"; bare numbers are MB
+    budget = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        name, _, size = item.partition("=")
+        m = re.fullmatch(r"([\d.]+)\s*([KMG]?)B?", size.strip(), re.IGNORECASE)
+        if not m:
+            raise ValueError(f"bad size budget {item!r}")
+        unit = m.group(2).upper() or "M"
+        budget[name.strip()] = int(float(m.group(1)) * UNITS[unit])
+    return budget
+
+
+def _strip_cmd(path, kind):
+    strip = os.environ.get("STRIP", "strip")
+    if platform.system() == "Darwin":
+        # -x keeps the global symbols dylibs and extension modules export
+        return [strip, "-S" if kind == "archive" else "-x", str(path)]
+    if kind == "archive":
+        # archives still get linked against, only the debug info can go
+        return [strip, "-g", str(path)]
+    return [strip, "--strip-unneeded", str(path)]
+
+
+def strip_file(path, kind, debug_dir=None, rel=None):
+    objcopy = os.environ.get("OBJCOPY", "objcopy")
+    if debug_dir is not None and kind == "elf":
+        debug_file = Path(debug_dir) / (rel + ".debug")
+        debug_file.parent.mkdir(parents=True, exist_ok=True)
+        subprocess.run([objcopy, "--only-keep-debug", str(path), str(debug_file)], check=True)
+    res = subprocess.run(_strip_cmd(path, kind), capture_output=True, text=True)
+    if res.returncode != 0:
+        print(f"STRIP failed on {path}: {res.stderr.strip()}", file=sys.stderr)
+        return False
+    if debug_dir is not None and kind == "elf":
+        subprocess.run(
+            [objcopy, f"--add-gnu-debuglink={debug_file}", str(path)], check=True
+        )
+    if platform.system() == "Darwin" and kind == "macho":
+        # stripping invalidates the (ad-hoc) signature, arm64 won't load it otherwise
+        subprocess.run(["codesign", "--force", "--sign", "-", str(path)], capture_output=True)
+    return True
+
+
+def _sizes(root):
+    sizes = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            p = Path(dirpath) / name
+            if not p.is_symlink():
+                sizes[p.relative_to(root).as_posix()] = p.stat().st_size
+    return sizes
+
+
+def strip(root, debug_dir=None, jobs=None):
+    start = time.perf_counter()
+    root = Path(root)
+    if platform.system() == "Windows" or not shutil.which(os.environ.get("STRIP", "strip")):
+        print("STRIP no strip available, skipping", file=sys.stderr)
+        return 0
+    if debug_dir is not None and platform.system() != "Linux":
+        print("STRIP split debug info is only supported for ELF", file=sys.stderr)
+        debug_dir = None
+    targets = []
+    for rel in sorted(_sizes(root)):
+        kind = file_kind(root / rel)
+        if kind is not None:
+            targets.append((root / rel, kind, rel))
+    with ThreadPoolExecutor(jobs or os.cpu_count() or 1) as pool:
+        ok = list(pool.map(lambda t: strip_file(t[0], t[1], debug_dir, t[2]), targets))
+    print(
+        f"STRIP stripped {sum(ok)}/{len(targets)} binaries in {root} "
+        f"in {time.perf_counter() - start:.1f}s",
+        file=sys.stderr,
+    )
+    return sum(ok)
+
+
+def size_report(before, after, top=50):
+    components = defaultdict(lambda: {"before": 0, "after": 0, "files": 0})
+    for rel, size in after.items():
+        c = components[component(rel)]
+        c["before"] += before.get(rel, size)
+        c["after"] += size
+        c["files"] += 1
+    largest = sorted(after.items(), key=lambda kv: -kv[1])[:top]
+    return {
+        "total": {"before": sum(before.values()), "after": sum(after.values()), "files": len(after)},
+        "components": dict(sorted(components.items(), key=lambda kv: -kv[1]["after"])),
+        "largest": [
+            {"path": rel, "component": component(rel), "before": before.get(rel, size), "after": size}
+            for rel, size in largest
+        ],
+    }
+
+
+def check_budget(report, budget):
+    over = []
+    for name, limit in budget.items():
+        entry = report["total"] if name == "total" else report["components"].get(name)
+        if entry is not None and entry["after"] > limit:
+            over.append(f"{name}: {entry['after'] / 2**20:.1f}MB > {limit / 2**20:.1f}MB")
+    return over
+
+
+def strip_and_report(root, out_dir, do_strip=True, debug_dir=None, budget=None):
+    root = Path(root)
+    before = _sizes(root)
+    if do_strip:
+        strip(root, debug_dir)
+    report = size_report(before, _sizes(root))
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / "size_report.json").write_text(json.dumps(report, indent=2))
+
+    t = report["total"]
+    print(
+        f"SIZE {root}: {t['before'] / 2**20:.1f}MB -> {t['after'] / 2**20:.1f}MB in {t['files']} files",
+        file=sys.stderr,
+    )
+    for name, c in report["components"].items():
+        print(
+            f"SIZE {name}: {c['before'] / 2**20:.1f}MB -> {c['after'] / 2**20:.1f}MB ({c['files']} files)",
+            file=sys.stderr,
+        )
+    over = check_budget(report, parse_budget(budget) if budget else {})
+    if over:
+        raise RuntimeError(f"install size budget exceeded: {'; '.join(over)}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Strip binaries in an install tree and report sizes")
+    parser.add_argument("root")
+    parser.add_argument("-o", "--output-dir", default=".")
+    parser.add_argument("--no-strip", action="store_true", help="only write the size report")
+    parser.add_argument("--debug-dir", default=None, help="keep ELF debug info here as .debug files")
+    parser.add_argument("--budget", default=os.environ.get("INSTALL_SIZE_BUDGET"), help="e.g. total=2G,mlir=900M")
+    args = parser.parse_args()
+    try:
+        strip_and_report(args.root, args.output_dir, not args.no_strip, args.debug_dir, args.budget)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
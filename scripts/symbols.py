@@ -1,105 +1,166 @@
+import argparse
+import os
 import re
+import struct
+import subprocess
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
 
 
 class TooComplexName(Exception):
     pass
 
 
-def skip_itanium_template(arg):
+# The parsers below walk the mangled name with an index instead of slicing it
+# at every step. Each (\d+)(.+)-style match of the original patterns is done
+# with a prefix regex and an explicit check that at least one character follows.
+DIGITS_RE = re.compile(r"\d+")
+SUBSTITUTION_RE = re.compile(r"S[A-Z0-9]*_")
+NESTED_SUBSTITUTION_RE = re.compile(r"NS[A-Z0-9]*_")
+CV_REF_QUALIFIERS_RE = re.compile(r"[rVKRO]*")
+NOT_E_RE = re.compile(r"[^E]+")
+NESTED_MANGLING_RE = re.compile(r"_Z(?:T[VTIS])?(?=N.)")
+
+
+def _source_name_end(s, pos, end):
+    # <length><identifier>; returns where the identifier ends
+    match = DIGITS_RE.match(s, pos)
+    if not match:
+        return None
+    digits_end = match.end()
+    if digits_end == end:
+        # all digits: the last one has to be left over as the "rest"
+        if digits_end - pos < 2:
+            return None
+        digits_end -= 1
+    return min(digits_end + int(s[pos:digits_end]), end)
+
+
+def _skip_template(s, pos):
     # A template argument list starts with I
-    assert arg.startswith("I"), arg
-    tmp = arg[1:]
-    while tmp:
+    end = len(s)
+    pos += 1
+    while pos < end:
         # Check for names
-        match = re.match("(\d+)(.+)", tmp)
-        if match:
-            n = int(match.group(1))
-            tmp = match.group(2)[n:]
+        name_end = _source_name_end(s, pos, end)
+        if name_end is not None:
+            pos = name_end
             continue
+        c = s[pos]
         # Check for substitutions
-        match = re.match("S[A-Z0-9]*_(.+)", tmp)
-        if match:
-            tmp = match.group(1)
+        match = SUBSTITUTION_RE.match(s, pos)
+        if match and match.end() < end:
+            pos = match.end()
         # Start of a template
-        elif tmp.startswith("I"):
-            tmp = skip_itanium_template(tmp)
+        elif c == "I":
+            pos = _skip_template(s, pos)
+            if pos is None:
+                return None
         # Start of a nested name
-        elif tmp.startswith("N"):
-            _, tmp = parse_itanium_nested_name(tmp)
+        elif c == "N":
+            _, pos = _parse_nested_name(s, pos)
+            if pos is None:
+                return None
         # Start of an expression: assume that it's too complicated
-        elif tmp.startswith("L") or tmp.startswith("X"):
+        elif c == "L" or c == "X":
             raise TooComplexName
         # End of the template
-        elif tmp.startswith("E"):
-            return tmp[1:]
+        elif c == "E":
+            return pos + 1
         # Something else: probably a type, skip it
         else:
-            tmp = tmp[1:]
+            pos += 1
     return None
 
 
-def parse_itanium_name(arg):
+def _parse_name(s, pos):
+    end = len(s)
+    if pos >= end:
+        return None, pos
     # Check for a normal name
-    match = re.match("(\d+)(.+)", arg)
-    if match:
-        n = int(match.group(1))
-        name = match.group(1) + match.group(2)[:n]
-        rest = match.group(2)[n:]
-        return name, rest
+    name_end = _source_name_end(s, pos, end)
+    if name_end is not None:
+        return name_end, name_end
     # Check for constructor/destructor names
-    match = re.match("([CD][123])(.+)", arg)
-    if match:
-        return match.group(1), match.group(2)
+    if s[pos] in "CD" and pos + 2 < end and s[pos + 1] in "123":
+        return pos + 2, pos + 2
     # Assume that a sequence of characters that doesn't end a nesting is an
     # operator (this is very imprecise, but appears to be good enough)
-    match = re.match("([^E]+)(.+)", arg)
+    match = NOT_E_RE.match(s, pos)
     if match:
-        return match.group(1), match.group(2)
+        name_end = match.end()
+        if name_end == end:
+            if name_end - pos < 2:
+                return None, pos
+            name_end -= 1
+        return name_end, name_end
     # Anything else: we can't handle it
-    return None, arg
+    return None, pos
 
 
-def parse_itanium_nested_name(arg):
-    # A nested name starts with N
-    assert arg.startswith("N"), arg
+def _parse_nested_name(s, pos):
+    # returns ([(start, end, is_template)], position after the E)
+    end = len(s)
     ret = []
 
     # Skip past the N, and possibly a substitution
-    match = re.match("NS[A-Z0-9]*_(.+)", arg)
-    if match:
-        tmp = match.group(1)
-    else:
-        tmp = arg[1:]
+    match = NESTED_SUBSTITUTION_RE.match(s, pos)
+    pos = match.end() if match and match.end() < end else pos + 1
 
-    # Skip past CV-qualifiers and ref qualifiers
-    match = re.match("[rVKRO]*(.+)", tmp)
-    if match:
-        tmp = match.group(1)
+    # Skip past CV-qualifiers and ref qualifiers, leaving at least one char
+    if pos < end:
+        pos = min(CV_REF_QUALIFIERS_RE.match(s, pos).end(), end - 1)
 
     # Repeatedly parse names from the string until we reach the end of the
     # nested name
-    while tmp:
+    while pos is not None and pos < end:
         # An E ends the nested name
-        if tmp.startswith("E"):
-            return ret, tmp[1:]
+        if s[pos] == "E":
+            return ret, pos + 1
         # Parse a name
-        name_part, tmp = parse_itanium_name(tmp)
-        if not name_part:
+        start = pos
+        name_end, pos = _parse_name(s, pos)
+        if name_end is None:
             # If we failed then we don't know how to demangle this
             return None, None
         is_template = False
         # If this name is a template record that, then skip the template
         # arguments
-        if tmp.startswith("I"):
-            tmp = skip_itanium_template(tmp)
+        if pos < end and s[pos] == "I":
+            pos = _skip_template(s, pos)
             is_template = True
         # Add the name to the list
-        ret.append((name_part, is_template))
+        ret.append((start, name_end, is_template))
 
     # If we get here then something went wrong
     return None, None
 
 
+def skip_itanium_template(arg):
+    assert arg.startswith("I"), arg
+    pos = _skip_template(arg, 0)
+    return None if pos is None else arg[pos:]
+
+
+def parse_itanium_name(arg):
+    name_end, pos = _parse_name(arg, 0)
+    if name_end is None:
+        return None, arg
+    return arg[:name_end], arg[pos:]
+
+
+def parse_itanium_nested_name(arg):
+    assert arg.startswith("N"), arg
+    names, pos = _parse_nested_name(arg, 0)
+    if names is None:
+        return None, None
+    return [(arg[a:b], t) for a, b, t in names], arg[pos:]
+
+
 def should_keep_itanium_symbol(symbol, calling_convention_decoration=False):
     # Start by removing any calling convention decoration (which we expect to
     # see on all symbols, even mangled C++ symbols)
@@ -109,34 +170,281 @@ def should_keep_itanium_symbol(symbol, calling_convention_decoration=False):
     if not symbol.startswith("_") and not symbol.startswith("."):
         return symbol
     # Discard manglings that aren't nested names
-    match = re.match("_Z(T[VTIS])?(N.+)", symbol)
+    match = NESTED_MANGLING_RE.match(symbol)
     if not match:
         return None
     # Demangle the name. If the name is too complex then we don't need to keep
     # it, but it the demangling fails then keep the symbol just in case.
     try:
-        names, _ = parse_itanium_nested_name(match.group(2))
+        names, _ = _parse_nested_name(symbol, match.end())
     except TooComplexName:
         return None
     if not names:
         return symbol
     # Keep llvm:: and clang:: names
-    elif names[0][0] == "4llvm" or names[0][0] == "5clang":
+    start, end, _ = names[0]
+    if (end - start == 5 and symbol.startswith("4llvm", start)) or (
+        end - start == 6 and symbol.startswith("5clang", start)
+    ):
         return symbol
     # Discard everything else
-    else:
+    return None
+
+
+# defined, global symbols in `nm -P` output (same set as llvm's extract_symbols.py)
+NM_KEEP_TYPES = set("BDGRSTuVW")
+HEX_RE = re.compile(r"^[0-9a-fA-F]+$")
+SHARED_OBJECT_RE = re.compile(r"\.so(\.\d+)*$")
+
+
+def parse_symbol_line(line):
+    # accepts one symbol per line, `nm -P` ("name type value size") or BSD
+    # `nm` ("value type name" / "type name") lines; archive member headers
+    # ("lib.a[foo.o]:" / "foo.o:") and blank lines are skipped. ELF version
+    # suffixes (sym@V, sym@@V) are dropped, like everywhere else in here
+    fields = line.split()
+    if not fields or (len(fields) == 1 and fields[0].endswith(":")):
         return None
+    if len(fields) == 1:
+        name = fields[0]
+    elif len(fields) == 2 and len(fields[0]) == 1:
+        if fields[0] not in NM_KEEP_TYPES:
+            return None
+        name = fields[1]
+    elif len(fields[1]) == 1:
+        if fields[1] not in NM_KEEP_TYPES:
+            return None
+        # by position, not by what looks like hex (names can be all hex):
+        # BSD is "address type name" with the address zero padded to 8 or 16
+        # digits; -P is "name type value [size]"
+        if len(fields) == 3 and len(fields[0]) in {8, 16} and HEX_RE.match(fields[0]):
+            name = fields[2]
+        else:
+            name = fields[0]
+    else:
+        name = fields[0]
+    return name.split("@")[0]
+
+
+def _filter_chunk(args):
+    lines, calling_convention_decoration = args
+    kept = []
+    n = 0
+    for line in lines:
+        s = parse_symbol_line(line)
+        if s is None:
+            continue
+        n += 1
+        if should_keep_itanium_symbol(s, calling_convention_decoration):
+            kept.append(s)
+    return n, kept
+
+
+def _read_lines(inputs, nm=None):
+    if nm is not None:
+        for path in inputs:
+            # ELF shared objects only have the dynamic symbol table after stripping
+            dynamic = ["-D"] if sys.platform.startswith("linux") and SHARED_OBJECT_RE.search(path) else []
+            proc = subprocess.Popen(
+                [nm, "-P", "-g", "--defined-only", *dynamic, path], stdout=subprocess.PIPE, text=True
+            )
+            yield from proc.stdout
+            if proc.wait() != 0:
+                raise RuntimeError(f"{nm} failed on {path}")
+        return
+    for path in inputs:
+        if path == "-":
+            yield from sys.stdin
+        else:
+            with open(path, errors="replace") as f:
+                yield from f
+
+
+def filter_symbols(lines, calling_convention_decoration=True, jobs=None, chunk_size=20000, stats=None):
+    # yields kept symbols in input order; at most 2 * jobs chunks are in flight
+    # so arbitrarily long pipes stream through in bounded memory
+    jobs = jobs or os.cpu_count() or 1
+    stats = stats if stats is not None else {}
+    stats.update(symbols=0, kept=0)
+    lines = iter(lines)
+    chunks = iter(lambda: list(islice(lines, chunk_size)), [])
+
+    def results():
+        if jobs == 1:
+            for chunk in chunks:
+                yield _filter_chunk((chunk, calling_convention_decoration))
+            return
+        with ProcessPoolExecutor(jobs) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(_filter_chunk, (chunk, calling_convention_decoration)))
+                if len(pending) >= 2 * jobs:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    for n, kept in results():
+        stats["symbols"] += n
+        stats["kept"] += len(kept)
+        yield from kept
+
+
+# export lists for the linker, see MLIR_PYTHON_CAPI_EXPORTS_FILE in python_bindings/CMakeLists.txt
+EXPORT_FORMATS = ["version-script", "def", "exported-symbols"]
+
+
+def undefined_symbols(paths, nm):
+    undefined = set()
+    for path in paths:
+        dynamic = ["-D"] if sys.platform.startswith("linux") and SHARED_OBJECT_RE.search(str(path)) else []
+        res = subprocess.run([nm, "-P", "-u", *dynamic, str(path)], capture_output=True, text=True, check=True)
+        for line in res.stdout.splitlines():
+            fields = line.split()
+            if not fields:
+                continue
+            # BSD nm puts the type first
+            name = fields[1] if len(fields) > 1 and len(fields[0]) == 1 else fields[0]
+            undefined.add(name.split("@")[0])
+    return undefined
+
+
+def export_list(defined, required=(), calling_convention_decoration=False, minimal=False):
+    # symbols to export from a shared library: whatever the filter keeps (or
+    # only the unmangled C API with minimal=True) plus everything that
+    # `required` (usually the undefined symbols of the modules linking
+    # against it) needs. Names are kept as nm prints them, i.e. with the
+    # Mach-O leading underscore, which is what the export files want.
+    required = set(required)
+    exports = set()
+    for s in defined:
+        s = s.split("@")[0]
+        if s in required:
+            exports.add(s)
+            continue
+        kept = should_keep_itanium_symbol(s, calling_convention_decoration)
+        if kept and (not minimal or not kept.startswith(("_", "."))):
+            exports.add(s)
+    return sorted(exports)
+
+
+def write_export_file(symbols, out, fmt, library=None):
+    if fmt == "version-script":
+        # quoted, so nothing is taken for a glob
+        out.write("{\n  global:\n")
+        out.writelines(f'    "{s}";\n' for s in symbols)
+        out.write("  local:\n    *;\n};\n")
+    elif fmt == "def":
+        if library:
+            out.write(f"LIBRARY {library}\n")
+        out.write("EXPORTS\n")
+        out.writelines(f"  {s}\n" for s in symbols)
+    elif fmt == "exported-symbols":
+        out.writelines(f"{s}\n" for s in symbols)
+    else:
+        raise ValueError(f"unknown export format {fmt}")
+
+
+def dynsym_size(path):
+    # bytes of .dynsym plus its string table; None if this isn't ELF
+    with open(path, "rb") as f:
+        ident = f.read(16)
+        if ident[:4] != b"\x7fELF":
+            return None
+        is64 = ident[4] == 2
+        end = "<" if ident[5] == 1 else ">"
+        f.seek(0x28 if is64 else 0x20)
+        (shoff,) = struct.unpack(end + ("Q" if is64 else "I"), f.read(8 if is64 else 4))
+        f.seek(0x3A if is64 else 0x2E)
+        shentsize, shnum, _ = struct.unpack(end + "HHH", f.read(6))
+        f.seek(shoff)
+        table = f.read(shentsize * shnum)
+    # (type, size, link) of every section header
+    fmt = end + ("4xI16x8xQI" if is64 else "4xI8x4xII")
+    sections = [struct.unpack_from(fmt, table, i * shentsize) for i in range(shnum)]
+    SHT_DYNSYM = 11
+    for sh_type, size, link in sections:
+        if sh_type == SHT_DYNSYM:
+            return size + (sections[link][1] if link < len(sections) else 0)
+    return 0
+
+
+def defined_symbols(paths, nm):
+    return {s.split("@")[0] for s in map(parse_symbol_line, _read_lines([str(p) for p in paths], nm)) if s}
+
+
+def export_stats(lib, nm="nm"):
+    lib = str(lib)
+    return {
+        "exports": len(defined_symbols([lib], nm)),
+        "dynsym_bytes": dynsym_size(lib),
+        "file_bytes": Path(lib).stat().st_size,
+    }
 
 
 if __name__ == "__main__":
-    keep_symbols = []
-    with open("symbols.txt") as sf:
-        symbols = sf.readlines()
-    for s in symbols:
-        s = s.strip()
-        if should_keep_itanium_symbol(s, calling_convention_decoration=True):
-            keep_symbols.append(s)
-    print(",".join(keep_symbols[:1000]))
+    parser = argparse.ArgumentParser(description="Filter symbols to the llvm::/clang:: ones worth exporting")
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        help="symbol lists or nm output ('-' is stdin, default symbols.txt); object files/archives with --nm",
+    )
+    parser.add_argument("--nm", nargs="?", const=os.environ.get("NM", "nm"), default=None, help="run nm on the inputs")
+    parser.add_argument("-o", "--output", default=None)
+    parser.add_argument("--format", choices=["comma", "lines", *EXPORT_FORMATS], default="comma")
+    parser.add_argument(
+        "--importers",
+        nargs="*",
+        default=[],
+        help="also export whatever these modules import from the inputs (export formats only)",
+    )
+    parser.add_argument(
+        "--minimal", action="store_true", help="export only unmangled names and what --importers need"
+    )
+    parser.add_argument("--library", default=None, help="LIBRARY name for --format def")
+    parser.add_argument("--unique", action="store_true")
+    parser.add_argument(
+        "--no-calling-convention-decoration",
+        dest="decoration",
+        action="store_false",
+        help="symbols don't have the extra leading _ (ELF)",
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=None)
+    args = parser.parse_args()
+
+    inputs = args.inputs or ["symbols.txt"]
+    out = open(args.output, "w") if args.output else sys.stdout
+    if args.format in EXPORT_FORMATS:
+        defined = filter(None, map(parse_symbol_line, _read_lines(inputs, args.nm)))
+        required = undefined_symbols(args.importers, args.nm or os.environ.get("NM", "nm"))
+        exports = export_list(defined, required, args.decoration, args.minimal)
+        write_export_file(exports, out, args.format, args.library)
+        if out is not sys.stdout:
+            out.close()
+        print(f"SYMBOLS {len(exports)} exports written as {args.format}", file=sys.stderr)
+        sys.exit(0)
+    sep = "," if args.format == "comma" else "\n"
+    start = time.perf_counter()
+    seen = set()
+    stats = {}
+    first = True
+    for s in filter_symbols(_read_lines(inputs, args.nm), args.decoration, args.jobs, stats=stats):
+        if args.unique:
+            if s in seen:
+                continue
+            seen.add(s)
+        if not first:
+            out.write(sep)
+        out.write(s)
+        first = False
+    out.write("\n")
+    if out is not sys.stdout:
+        out.close()
+    elapsed = time.perf_counter() - start
+    print(
+        f"SYMBOLS {stats['symbols']} in, {stats['kept']} kept in {elapsed:.2f}s "
+        f"({stats['symbols'] / max(elapsed, 1e-9):.0f} symbols/s)",
+        file=sys.stderr,
+    )
 
 # target_link_options(mlir-opt PUBLIC -Wl,--export-all)
-# target_link_options(mlir-opt PUBLIC -Wl,--unresolved-symbols=ignore-all)
\ No newline at end of file
+# target_link_options(mlir-opt PUBLIC -Wl,--unresolved-symbols=ignore-all)
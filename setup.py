@@ -13,6 +13,18 @@ from pprint import pprint
 from setuptools import Extension, setup
 from setuptools.command.build_ext import build_ext
 
+sys.path.insert(0, str(Path(__file__).parent.resolve() / "scripts"))
+import build_jobs
+import build_layers
+import build_pgo
+import build_profile
+import ccache_report
+import configure_cache
+import dedup_tree
+import fast_link
+import normalize_tree
+import strip_tree
+
 
 class CMakeExtension(Extension):
     def __init__(self, name: str, sourcedir: str = "") -> None:
@@ -41,6 +53,7 @@ class CMakeBuild(build_ext):
         cmake_generator = os.environ.get("CMAKE_GENERATOR", "Ninja")
 
         RUN_TESTS = "ON" if check_env("RUN_TESTS") else "OFF"
+        install_target = "install-distribution" if DISTRIBUTION_PROFILE else "install"
         # make windows happy
         PYTHON_EXECUTABLE = str(Path(sys.executable))
         if platform.system() == "Windows":
@@ -60,6 +73,8 @@ class CMakeBuild(build_ext):
             f"-DBUILD_AMDGPU={BUILD_AMDGPU}",
             f"-DBUILD_OPENMP={BUILD_OPENMP}",
             f"-DBUILD_VULKAN={BUILD_VULKAN}",
+            f"-DBUILD_PERF={BUILD_PERF}",
+            f"-DDISTRIBUTION_PROFILE={DISTRIBUTION_PROFILE}",
             f"-DCIBW_ARCHS={os.getenv('CIBW_ARCHS')}",
             f"-DRUN_TESTS={RUN_TESTS}",
         ]
@@ -72,6 +87,7 @@ class CMakeBuild(build_ext):
             cmake_args += [os.environ["CMAKE_ARGS"]]
 
         build_args = []
+        ninja_executable_path = None
         if self.compiler.compiler_type != "msvc":
             if not cmake_generator or cmake_generator == "Ninja":
                 try:
@@ -111,63 +127,163 @@ class CMakeBuild(build_ext):
                 cmake_args += ["-DCMAKE_OSX_ARCHITECTURES={}".format(";".join(archs))]
 
         if "PARALLEL_LEVEL" not in os.environ:
-            build_args += [f"-j{str(2 * os.cpu_count())}"]
+            jobs = build_jobs.pick_jobs()
+            build_args += [f"-j{jobs['compile']}"]
+            # only the Ninja generator honors the LLVM job pools
+            for pool in ["LINK", "TABLEGEN"]:
+                if f"LLVM_PARALLEL_{pool}_JOBS" not in os.environ.get("CMAKE_ARGS", ""):
+                    cmake_args += [f"-DLLVM_PARALLEL_{pool}_JOBS={jobs[pool.lower()]}"]
         else:
             build_args += [f"-j{os.environ.get('PARALLEL_LEVEL')}"]
 
+        layered_base = None
+        if "LAYERED_BUILD_DIR" in os.environ:
+            layered_base = build_layers.base_dir(os.environ["LAYERED_BUILD_DIR"])
+            if build_layers.is_variant():
+                if layered_base.exists() and not (build_temp / "CMakeCache.txt").exists():
+                    build_layers.restore(layered_base, build_temp)
+                # has to come before -C config.cmake
+                cmake_args += [f"-U{v}" for v in build_layers.VARIANT_CACHE_VARS]
+
         config_cmake = Path(__file__).parent.resolve() / "config.cmake"
         assert config_cmake.exists()
+        if "CONFIGURE_CACHE_DIR" in os.environ:
+            cmake_args += configure_cache.seed_args(
+                os.environ["CONFIGURE_CACHE_DIR"], config_cmake
+            )
+        if "PRINT_CONFIG_VARIABLES" in os.environ:
+            cmake_args += [f"-DPRINT_CONFIG_VARIABLES={os.environ['PRINT_CONFIG_VARIABLES']}"]
         cmake_args.append(f"-C {config_cmake}")
 
         print("ENV", pprint(os.environ), file=sys.stderr)
         print("CMAKE_ARGS", cmake_args, file=sys.stderr)
 
-        subprocess.run(
-            ["cmake", ext.sourcedir, *cmake_args], cwd=build_temp, check=True
-        )
-        if check_env("DEBUG_CI_FAST_BUILD"):
+        fast_link_info = None
+        if check_env("FAST_LINK"):
+            # BUILD_PERF is ThinLTO with clang, which wants lld
+            link_args, fast_link_info = fast_link.fast_link_args(
+                build_temp,
+                cmake_args,
+                prefer=["lld", "mold"] if BUILD_PERF else fast_link.LINKERS,
+            )
+            cmake_args += link_args
+        else:
+            # first, so a -D from CMAKE_ARGS and config.cmake's set() still win
+            cmake_args[:0] = fast_link.reset_args(build_temp)
+        ninja_runs = len(fast_link.ninja_runs(build_temp))
+
+        timer = build_profile.PhaseTimer()
+        pgo_dir = build_temp.parent / "pgo"
+        if check_env("BUILD_PGO"):
+            with timer.phase("pgo"):
+                profile = build_pgo.instrumented_profile(
+                    ext.sourcedir, cmake_args, build_args, pgo_dir
+                )
+            cmake_args += [f"-DLLVM_PROFDATA_FILE={profile}"]
+        if check_env("BUILD_BOLT"):
+            cmake_args += build_pgo.bolt_cmake_args(cmake_args)
+        with timer.phase("configure"):
             subprocess.run(
-                ["cmake", "--build", ".", "--target", "llvm-tblgen", *build_args],
-                cwd=build_temp,
-                check=True,
+                ["cmake", ext.sourcedir, *cmake_args], cwd=build_temp, check=True
             )
+        configure_cache.print_variables_diff(build_temp)
+        if "CONFIGURE_CACHE_DIR" in os.environ:
+            configure_cache.update(os.environ["CONFIGURE_CACHE_DIR"], config_cmake, build_temp)
+        # after configure so the try_compile noise stays out of the log
+        ccache_log = build_temp / "ccache.log"
+        if check_env("CCACHE_ANALYZE"):
+            ccache_log.unlink(missing_ok=True)
+            os.environ["CCACHE_LOGFILE"] = str(ccache_log)
+        if check_env("DEBUG_CI_FAST_BUILD"):
+            with timer.phase("build"):
+                build_jobs.run_build(
+                    ["cmake", "--build", ".", "--target", "llvm-tblgen", *build_args],
+                    cwd=build_temp,
+                    check=True,
+                    watchdog=not check_env("DISABLE_BUILD_WATCHDOG"),
+                )
             shutil.rmtree(install_dir / "bin", ignore_errors=True)
             shutil.copytree(build_temp / "bin", install_dir / "bin")
         else:
-            subprocess.run(
-                ["cmake", "--build", ".", "--target", "install", *build_args],
-                cwd=build_temp,
-                check=True,
-            )
+            with timer.phase("build"):
+                build_jobs.run_build(
+                    ["cmake", "--build", ".", "--target", install_target, *build_args],
+                    cwd=build_temp,
+                    check=True,
+                    watchdog=not check_env("DISABLE_BUILD_WATCHDOG"),
+                )
             if RUN_TESTS:
                 env = os.environ.copy()
                 # PYTHONPATH needs to be set to find build deps like numpy
                 # https://github.com/llvm/llvm-project/pull/89296
                 env["MLIR_LIT_PYTHONPATH"] = os.pathsep.join(sys.path)
-                subprocess.run(
-                    ["cmake", "--build", ".", "--target", "check-all", *build_args],
-                    cwd=build_temp,
-                    env=env,
-                    check=False,
+                with timer.phase("check-all"):
+                    build_jobs.run_build(
+                        ["cmake", "--build", ".", "--target", "check-all", *build_args],
+                        cwd=build_temp,
+                        env=env,
+                        check=False,
+                        watchdog=not check_env("DISABLE_BUILD_WATCHDOG"),
+                    )
+
+        # archives left thin by an earlier FAST_LINK build aren't re-archived
+        # (same command line), so this runs either way
+        fast_link.fatten_archives(install_dir, build_temp)
+        if fast_link_info is not None:
+            fast_link.link_report(
+                build_temp,
+                os.environ.get("BUILD_PROFILE_DIR", build_temp),
+                ninja_runs,
+                fast_link_info,
+            )
+
+        # before stripping, BOLT needs the symbols and relocations
+        if check_env("BUILD_BOLT"):
+            with timer.phase("bolt"):
+                build_pgo.bolt(
+                    install_dir / "bin",
+                    Path(ext.sourcedir).parent,
+                    pgo_dir / "bolt",
+                    build_pgo.cache_value(build_temp, "LLVM_TARGETS_TO_BUILD").split(";"),
+                )
+
+        if (
+            layered_base is not None
+            and not build_layers.is_variant()
+            and not check_env("DEBUG_CI_FAST_BUILD")
+        ):
+            with timer.phase("snapshot"):
+                build_layers.snapshot(build_temp, layered_base)
+
+        if check_env("STRIP_INSTALL_TREE") or "INSTALL_SIZE_BUDGET" in os.environ:
+            with timer.phase("strip"):
+                strip_tree.strip_and_report(
+                    install_dir,
+                    os.environ.get("BUILD_PROFILE_DIR", build_temp),
+                    do_strip=check_env("STRIP_INSTALL_TREE"),
+                    debug_dir=os.environ.get("STRIP_DEBUG_DIR"),
+                    budget=os.environ.get("INSTALL_SIZE_BUDGET"),
                 )
-            shutil.rmtree(install_dir / "python_packages", ignore_errors=True)
-
-        subprocess.run(
-            [
-                "find",
-                ".",
-                "-exec",
-                "touch",
-                "-a",
-                "-m",
-                "-t",
-                "197001010000",
-                "{}",
-                ";",
-            ],
-            cwd=install_dir,
-            check=False,
-        )
+
+        if check_env("DEDUP_INSTALL_TREE"):
+            with timer.phase("dedup"):
+                dedup_tree.report(install_dir)
+
+        with timer.phase("normalize"):
+            normalize_tree.normalize(install_dir)
+
+        if check_env("PROFILE_BUILD"):
+            build_profile.write_report(
+                build_temp,
+                os.environ.get("BUILD_PROFILE_DIR", build_temp),
+                phases=timer.phases,
+                target="llvm-tblgen" if check_env("DEBUG_CI_FAST_BUILD") else install_target,
+                ninja=ninja_executable_path,
+            )
+        if check_env("CCACHE_ANALYZE"):
+            ccache_report.write_report(
+                ccache_log, os.environ.get("BUILD_PROFILE_DIR", build_temp)
+            )
 
 
 def check_env(build):
@@ -206,6 +322,12 @@ if BUILD_VULKAN:
 BUILD_OPENMP = check_env("BUILD_OPENMP")
 if BUILD_OPENMP:
     local_version += ["openmp"]
+DISTRIBUTION_PROFILE = os.environ.get("DISTRIBUTION_PROFILE", "")
+if DISTRIBUTION_PROFILE:
+    local_version += [DISTRIBUTION_PROFILE.replace("-", "")]
+BUILD_PERF = check_env("BUILD_PERF")
+if BUILD_PERF:
+    local_version += ["perf"]
 if local_version:
     version += ".".join(local_version + [commit_hash])
 else: